@@ -0,0 +1,1377 @@
+# changalog.py
+# Parses ChaNGa logs into columns of step, phase and rung timings, and prints statistics.
+# Needs only NumPy, so it can be used without a display (see oldtimer_cli.py).
+
+import sys
+import re
+import os
+import collections
+import hashlib
+import itertools
+import multiprocessing
+import mmap
+import zipfile
+import zlib
+
+import numpy as np
+
+# Class RungIndex keeps info about a step on a rung, such as
+# the rung number from and to which the step is calculated, and the
+# line numbers of beginning and end of rung step in the log.
+# It is a view of one row of the rungs array of a ChangaLog (see RUNG_DTYPE),
+# with the fields of the row as attributes, so it holds no data of its own.
+class RungIndex(object):
+    __slots__ = ('rungs', 'row')
+
+    def __init__(self, rungs, row):
+        self.rungs = rungs
+        self.row = row
+
+    # step, fromRung, toRung, fromIndex, toIndex, gravityActive, gasActive
+    def __getattr__(self, name):
+        if name not in RUNG_DTYPE.names:
+            raise AttributeError(name)
+        return self.rungs[name][self.row].item()
+
+    def __repr__(self):
+        return "rung: " + str(self.fromRung) + " to " + str(self.toRung) + " from index " + str(self.fromIndex) + " to " + str(self.toIndex) + "(Gravity: " + str(self.gravityActive) + ")"
+
+# Row of the rungs array of a ChangaLog: one rung sub step ('Rungs 0 to 3. ...')
+RUNG_DTYPE = np.dtype([('step', np.int32),           # big step number
+                       ('fromRung', np.int32),
+                       ('toRung', np.int32),
+                       ('fromIndex', np.int32),      # first line index within the big step
+                       ('toIndex', np.int32),        # last line index within the big step
+                       ('gravityActive', np.int64),  # number of active particles
+                       ('gasActive', np.int64)])
+
+# Growable NumPy array holding one column of a ChangaLog.
+# Values are appended one at a time or in blocks; values() is a view of the
+# filled part, so reading a column never copies it.
+class Column():
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype)
+        self.size = 0
+
+    # Makes room for at least n more values, doubling the capacity as needed
+    def reserve(self, n):
+        if self.size + n > len(self.data):
+            data = np.empty(max(2 * len(self.data), self.size + n), self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, value):
+        self.reserve(1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        n = len(values)
+        self.reserve(n)
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+    def values(self):
+        return self.data[:self.size]
+
+    # Pickled without the unused capacity
+    def __getstate__(self):
+        return { 'data' : self.values(), 'size' : self.size }
+
+# State of a log parse between calls to ChangaLog.parselog: how far into the
+# log it got, and the big step it was in the middle of reading
+class ParseState():
+    def __init__(self, stepNumber=1, lineNumber=-1, offset=0):
+        # Bytes read and line number of the last line read
+        self.offset = offset
+        self.lineNumber = lineNumber
+        # Set once "Done." has been read
+        self.done = False
+        # Big step being read: its lines so far, and the times and rungs in them
+        self.stepNumber = stepNumber
+        self.stepFirstLine = lineNumber + 1
+        self.stepNumLines = 0
+        self.eventLines = []
+        self.eventPhases = []
+        self.eventTimes = []
+        self.rungFroms = []
+        self.rungTos = []
+        self.rungFromIndexes = []
+        self.rungGravityActives = []
+        self.rungGasActives = []
+
+class ChangaLog():
+
+    # Regex constants to search for key words in logfile
+    RE_RUNG_DISTRIBUTION = 'Rung distribution'
+    RE_DONE = 'Done.'
+    RE_BIG_STEP_LINE = 'Big step'
+    # Find number between 'took' and 'seconds'
+    RE_TOOK_SECONDS = '(?<=took.)([0-9]*\.?[0-9]+).(?=seconds)'
+    # Keywords of the timed phases are registered with registerPhase
+    # Step as first word on line
+    RE_SUB_STEP = '^Step:'
+    RE_GRAVITY_ACTIVE = '(?<=Gravity Active:.)([0-9]*\.?[0-9]+).'
+    # 'Rungs 0 to 3. Gravity Active: 1021611, Gas Active: 1021610', where
+    # Gas Active is missing from some logs
+    RE_RUNG_LINE = 'Rungs\s+(\d+)\s+to\s+(\d+)\.\s*Gravity Active:\s*(\d+)(?:,\s*Gas Active:\s*(\d+))?'
+
+    # Text that indicates if +consph is set
+    RE_ISCONSPH = 'Calculating gravity and SPH'
+
+    # Compiled once for the single-pass parser
+    TOOK_SECONDS = re.compile(RE_TOOK_SECONDS)
+    RUNG_LINE = re.compile(RE_RUNG_LINE)
+
+    # A line without any of these can only add to line counts and offsets, so
+    # the mapped reader does not copy it out of the file
+    SCAN_KEYWORDS = ['Rungs', 'took', RE_BIG_STEP_LINE, RE_DONE, RE_ISCONSPH]
+
+    # Registry of the timed phases (see registerPhase), in the order of the
+    # phase ids stored in eventPhase
+    PHASES = []
+    # All phase patterns in one alternation, longest first, so that each line
+    # reporting a time is searched once however many phases there are
+    PHASE_MATCHER = None
+    # Phase ids by text matched by PHASE_MATCHER, filled as texts are met
+    PHASE_IDS = {}
+
+    # List of Axes, filled by registerPhase
+    AXES_LIST = ['TotalStepTime']
+    CONSPH_AXES_LIST = ['TotalStepTime']
+
+    # List of resolutions
+    RESOLUTION_LIST = ['Big step', 'Sub step', 'Summed rungs']
+
+
+    # Bump whenever the columns change, so older cache files are reparsed
+    CACHE_VERSION = 4
+
+    # loglines: file object, list, or any other iterator of lines in logfile.
+    #           None leaves the log empty, e.g. to fill it with loadCache.
+    # Parsing prints nothing; call printStats for the statistics.
+    def __init__(self, loglines=None):
+        # Boolean indicating whether this log is for a +consph run
+        # consph runs don't have valid times for gravity, density, marking neighbors, pressure gradients, 
+        # or density of neighbors. But they do have a valid time for: calculating gravity and SPH
+        # Set by parselog, which sees every line of the log anyway
+        self.isconsph = False
+
+        # Columnar storage of everything parsed from the log.
+        # Big steps: one row per big step
+        self.stepColumns = { 'stepNumber' : Column(np.int32),      # first big step is #1, not #0
+                             'stepTime' : Column(np.float64),      # 'Big step 1 took 10.0 seconds'
+                             'stepFirstLine' : Column(np.int64),   # line number in the log where the step starts
+                             'stepNumLines' : Column(np.int32),
+                             'stepEndOffset' : Column(np.int64) }  # byte offset in the log just past the step
+        # Events: one row per phase time reported in the log, in log order
+        self.eventColumns = { 'eventStep' : Column(np.int32),      # big step number
+                              'eventLine' : Column(np.int32),      # line index within the big step
+                              'eventPhase' : Column(np.int8),      # index into PHASES
+                              'eventTime' : Column(np.float64) }
+        # Rungs: one row of RUNG_DTYPE per rung sub step, in log order
+        self.rungColumn = Column(RUNG_DTYPE)
+        # Rung sub step each event falls in, derived from the columns above
+        # when first needed, see getEventRungs
+        self.eventRungColumn = Column(np.int64)
+        # Series derived from the columns, computed for an axis the first time
+        # it is asked for, see getMemoized
+        self.memo = {}
+        # Series derived from the columns that only grow with them, extended
+        # by the new big steps, see getGrowingSeries
+        self.growing = {}
+        # Line numbers of 'Rungs' lines that could not be parsed, left out of the rungs
+        self.malformedLines = []
+
+        # Where parselog continues reading
+        self.parseState = ParseState()
+       
+        self.updateArrays()
+
+        if loglines is not None:
+            # Do parsing of entire log to build the columns of times
+            self.parselog(loglines)
+
+
+    # Begins the parsing of a log file, or continues it with lines appended since
+    # the last call (see updateFromFile).
+    # Every line is read exactly once: it is checked against all phase keywords,
+    # the rung line format and the big step/done markers in that single pass.
+    # Lines are not kept, so a log of any size is parsed in bounded memory.
+    # loglines: file object, list, or any other iterator of lines in logfile
+    # Returns the number of big steps completed by these lines.
+    def parselog(self, loglines):
+        return self.parseLines(itertools.izip(itertools.repeat(0), itertools.repeat(0), loglines))
+
+    # Parses the log file mapped in buf between two byte offsets, which must
+    # be at the start of lines. Only lines with a keyword of SCAN_KEYWORDS are
+    # copied out of buf, see iterMappedLines. Same results as parselog.
+    # Returns the number of big steps completed in that part of the log.
+    # bool final: end is the end of the log, so a last line without a newline
+    #             is parsed too, instead of being left for the next call
+    def parseMapped(self, buf, start, end, final=False):
+        return self.parseLines(iterMappedLines(buf, start, end, final=final))
+
+    # Does the work of parselog and parseMapped.
+    # items: iterator of (skippedLines, skippedBytes, line), where line is the next
+    #        line to parse and the skipped lines before it hold no keywords
+    def parseLines(self, items):
+
+        # Pick up where the last call left off, possibly in the middle of a big step
+        state = self.parseState
+        offset = state.offset
+        lineNumber = state.lineNumber
+        stepNumber = state.stepNumber
+        stepFirstLine = state.stepFirstLine
+        stepNumLines = state.stepNumLines
+        eventLines = state.eventLines
+        eventPhases = state.eventPhases
+        eventTimes = state.eventTimes
+        rungFroms = state.rungFroms
+        rungTos = state.rungTos
+        rungFromIndexes = state.rungFromIndexes
+        rungGravityActives = state.rungGravityActives
+        rungGasActives = state.rungGasActives
+        done = state.done
+        numBigSteps = self.getNumBigSteps()
+
+        for skippedLines, skippedBytes, line in items:
+            # consph is flagged by a keyword anywhere in the file, even past "Done."
+            if ChangaLog.RE_ISCONSPH in line:
+                self.isconsph = True
+            if done:
+                continue
+
+            offset += skippedBytes + len(line)
+            lineNumber += skippedLines + 1
+            # Line index within the big step
+            index = stepNumLines + skippedLines
+            stepNumLines = index + 1
+
+            if "Rungs" in line:
+                rung = self.parseRungLine(line)
+                if rung is None:
+                    self.malformedLines.append(lineNumber)
+                else:
+                    fromRung, toRung, gravityActive, gasActive = rung
+                    rungFroms.append(fromRung)
+                    rungTos.append(toRung)
+                    rungFromIndexes.append(index)
+                    rungGravityActives.append(gravityActive)
+                    rungGasActives.append(gasActive)
+
+            # Only lines reporting a time can add to a phase
+            took = None
+            if 'took' in line:
+                p = ChangaLog.TOOK_SECONDS.search(line)
+                if p is not None:
+                    took = float(p.group())
+                    for phase in ChangaLog.getLinePhaseIds(line):
+                        eventLines.append(index)
+                        eventPhases.append(phase)
+                        eventTimes.append(took)
+
+            if ChangaLog.RE_BIG_STEP_LINE in line:
+                self.stepColumns['stepNumber'].append(stepNumber)
+                # Total time reported for the big step ('Big step 1 took 10.0 seconds')
+                self.stepColumns['stepTime'].append(took if took is not None else 0.0)
+                self.stepColumns['stepFirstLine'].append(stepFirstLine)
+                self.stepColumns['stepNumLines'].append(stepNumLines)
+                self.stepColumns['stepEndOffset'].append(offset)
+
+                self.eventColumns['eventStep'].extend(np.repeat(stepNumber, len(eventLines)))
+                self.eventColumns['eventLine'].extend(eventLines)
+                self.eventColumns['eventPhase'].extend(eventPhases)
+                self.eventColumns['eventTime'].extend(eventTimes)
+
+                # Each rung runs up to the line before the next one, the last to the end of the step
+                rungToIndexes = [i - 1 for i in rungFromIndexes[1:]]
+                if rungFromIndexes:
+                    rungToIndexes.append(index)
+                rungs = np.empty(len(rungFroms), RUNG_DTYPE)
+                rungs['step'] = stepNumber
+                rungs['fromRung'] = rungFroms
+                rungs['toRung'] = rungTos
+                rungs['fromIndex'] = rungFromIndexes
+                rungs['toIndex'] = rungToIndexes
+                rungs['gravityActive'] = rungGravityActives
+                rungs['gasActive'] = rungGasActives
+                self.rungColumn.extend(rungs)
+
+                stepNumber += 1
+                stepFirstLine = lineNumber + 1
+                stepNumLines = 0
+                eventLines = []
+                eventPhases = []
+                eventTimes = []
+                rungFroms = []
+                rungTos = []
+                rungFromIndexes = []
+                rungGravityActives = []
+                rungGasActives = []
+
+            # "Done." signals the proper exit of ChaNGa
+            if ChangaLog.RE_DONE in line:
+                done = True
+
+        # Keep the partial big step for the next call
+        state.offset = offset
+        state.lineNumber = lineNumber
+        state.stepNumber = stepNumber
+        state.stepFirstLine = stepFirstLine
+        state.stepNumLines = stepNumLines
+        state.eventLines = eventLines
+        state.eventPhases = eventPhases
+        state.eventTimes = eventTimes
+        state.rungFroms = rungFroms
+        state.rungTos = rungTos
+        state.rungFromIndexes = rungFromIndexes
+        state.rungGravityActives = rungGravityActives
+        state.rungGasActives = rungGasActives
+        state.done = done
+
+        self.updateArrays()
+
+        #self.getCommand(bigSteps)
+    
+        return self.getNumBigSteps() - numBigSteps
+
+    # Parses the lines appended to a growing log file since the last parse,
+    # extending the columns with the big steps completed since then.
+    # Only the new part of the file is read.
+    # Returns the number of new big steps.
+    # file object f: the log, opened in binary mode
+    def updateFromFile(self, f):
+        size = os.fstat(f.fileno()).st_size
+        if size <= self.parseState.offset:
+            return 0
+        buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            return self.parseMapped(buf, self.parseState.offset, size)
+        finally:
+            buf.close()
+
+    # Writes the parsed columns and consph flag to an .npz cache file
+    # dict key: identifies the log the columns were parsed from, see getLogFingerprint
+    def saveCache(self, cachename, key):
+        arrays = { 'cacheVersion' : np.array(ChangaLog.CACHE_VERSION),
+                   'isconsph' : np.array(self.isconsph) }
+        for name, value in key.items():
+            arrays['key_' + name] = np.array(value)
+        for columns in [self.stepColumns, self.eventColumns]:
+            for name, column in columns.items():
+                arrays[name] = column.values()
+        arrays['rungs'] = self.rungColumn.values()
+        arrays['malformedLines'] = np.array(self.malformedLines, np.int64)
+        # eventPhase holds ids into the phases registered when parsing
+        arrays['phases'] = np.array([definition.axis for definition in ChangaLog.PHASES])
+        # Write to a temporary file first, so a crash never leaves a truncated cache
+        tmpname = cachename + '.tmp'
+        f = open(tmpname, 'wb')
+        try:
+            np.savez(f, **arrays)
+        finally:
+            f.close()
+        os.rename(tmpname, cachename)
+
+    # Fills this (empty) log from an .npz cache file written by saveCache.
+    # Returns False, leaving the log empty, if the file is missing, unreadable,
+    # from another cache version or not made from the log identified by key.
+    def loadCache(self, cachename, key):
+        # np.load of a truncated file leaves a broken NpzFile behind
+        if not zipfile.is_zipfile(cachename):
+            return False
+        try:
+            cache = np.load(cachename)
+        except CACHE_READ_ERRORS:
+            return False
+        try:
+            if int(cache['cacheVersion']) != ChangaLog.CACHE_VERSION:
+                return False
+            for name, value in key.items():
+                if cache['key_' + name].item() != value:
+                    return False
+            if cache['phases'].tolist() != [definition.axis for definition in ChangaLog.PHASES]:
+                return False
+            # Every member is read before any column is filled, so that a
+            # corrupt member leaves the log empty
+            names = [name for columns in [self.stepColumns, self.eventColumns] for name in columns]
+            arrays = dict([(name, cache[name]) for name in names + ['rungs', 'malformedLines', 'isconsph']])
+        except CACHE_READ_ERRORS + (KeyError,):
+            return False
+        finally:
+            cache.close()
+        for columns in [self.stepColumns, self.eventColumns]:
+            for name, column in columns.items():
+                column.extend(arrays[name])
+        self.rungColumn.extend(arrays['rungs'])
+        self.isconsph = bool(arrays['isconsph'])
+        self.updateArrays()
+        self.parseState = self.getResumeState()
+        # Lines after the last big step are parsed again when the log is
+        # followed, so their malformed lines are found again
+        self.malformedLines = [line for line in arrays['malformedLines'].tolist() if line < self.parseState.lineNumber + 1]
+        return True
+
+    # Appends the big steps of another log that continues this one, such as the
+    # next chunk of a log file parsed separately (see parseChangaLogParallel).
+    # This log must end at the end of a big step. Step and line numbers of the
+    # other log are shifted to follow on from this one, and its parse state
+    # becomes the state of this log.
+    def appendLog(self, other):
+        numBigSteps = self.getNumBigSteps()
+        numLines = self.parseState.lineNumber + 1
+        shifts = { 'stepNumber' : numBigSteps, 'stepFirstLine' : numLines,
+                   'eventStep' : numBigSteps }
+        for columns, otherColumns in [(self.stepColumns, other.stepColumns),
+                                      (self.eventColumns, other.eventColumns)]:
+            for name, column in columns.items():
+                values = otherColumns[name].values()
+                if name in shifts:
+                    values = values + shifts[name]
+                column.extend(values)
+        rungs = other.rungColumn.values().copy()
+        rungs['step'] += numBigSteps
+        self.rungColumn.extend(rungs)
+        self.malformedLines.extend([line + numLines for line in other.malformedLines])
+        self.isconsph = self.isconsph or other.isconsph
+
+        state = other.parseState
+        state.stepNumber += numBigSteps
+        state.lineNumber += numLines
+        state.stepFirstLine += numLines
+        self.parseState = state
+        self.updateArrays()
+
+    # Returns a ParseState continuing right after the last complete big step
+    def getResumeState(self):
+        numBigSteps = self.getNumBigSteps()
+        if numBigSteps == 0:
+            return ParseState()
+        return ParseState(numBigSteps + 1, self.stepFirstLine[-1] + self.stepNumLines[-1] - 1, self.stepEndOffset[-1])
+
+    # Points the array attributes (self.stepTime, self.eventTime, ...) at the
+    # filled part of their columns. Called whenever the columns have grown,
+    # so the memoized series no longer hold; growing series are extended
+    # when next asked for.
+    def updateArrays(self):
+        for columns in [self.stepColumns, self.eventColumns]:
+            for name, column in columns.items():
+                setattr(self, name, column.values())
+        self.rungs = self.rungColumn.values()
+        self.memo = {}
+
+    # Pickled without the array attributes set by updateArrays and the
+    # memoized series, which would otherwise be sent as copies of the columns;
+    # they are rebuilt on unpickling and on demand
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for columns in [self.stepColumns, self.eventColumns]:
+            for name in columns:
+                del state[name]
+        del state['rungs']
+        del state['memo']
+        del state['growing']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.growing = {}
+        self.updateArrays()
+
+    # Drops every series derived from the columns, memoized or growing, and
+    # the rungs of the events, as if the log had just been parsed
+    def clearDerived(self):
+        self.eventRungColumn = Column(np.int64)
+        self.growing = {}
+        self.updateArrays()
+
+    # Returns a value derived from the columns, memoized under key: compute()
+    # is only called the first time, and again once the columns have grown.
+    # Memoized arrays are read-only, as every caller gets the same one.
+    def getMemoized(self, key, compute):
+        value = self.memo.get(key)
+        if value is None:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self.memo[key] = value
+        return value
+
+    # Returns series derived from the columns whose rows never change once
+    # their big step is complete, such as a value per big step or per sub
+    # step, memoized under key. When the columns have grown, only the rows of
+    # the new big steps are computed and appended, so that following a log
+    # costs as much as what was added to it.
+    # make(): returns the empty series, a list of Columns and lists
+    # compute(start, series): returns the rows to append to each series for
+    #                         the big steps from row start on
+    # Returns the list of series, Columns as read-only arrays.
+    def getGrowingSeries(self, key, make, compute):
+        entry = self.growing.get(key)
+        if entry is None:
+            entry = self.growing[key] = [make(), 0]
+        series, numBigSteps = entry
+        if numBigSteps < self.getNumBigSteps():
+            for values, rows in zip(series, compute(numBigSteps, series)):
+                values.extend(rows)
+            entry[1] = self.getNumBigSteps()
+        result = []
+        for values in series:
+            if isinstance(values, Column):
+                values = values.values()
+                values.flags.writeable = False
+            result.append(values)
+        return result
+
+    # Returns the first rows in the event columns and in the rung columns of
+    # the big steps from row start on
+    def getStepStartRows(self, start):
+        return (np.searchsorted(self.eventStep, start + 1),
+                np.searchsorted(self.rungs['step'], start + 1))
+
+    # Returns an array with the row in the rung columns of the rung sub step
+    # each event falls in, or -1 for events before the first rung line of a step.
+    # Found the first time rungs are asked for, and then only for new events:
+    # those of complete big steps never change rung.
+    def getEventRungs(self):
+        if self.eventRungColumn.size < len(self.eventStep):
+            self.eventRungColumn.extend(self.findEventRungs(self.eventRungColumn.size))
+        return self.eventRungColumn.values()
+
+    # Returns an array with the row in the rung columns of the rung sub step
+    # each event from row start on falls in, or -1 for events before the first
+    # rung line of a step.
+    # Rungs of a step cover contiguous, non-overlapping line ranges, so one
+    # sorted search over their first lines attributes every event at once.
+    def findEventRungs(self, start=0):
+        eventSteps = self.eventStep[start:]
+        if len(eventSteps) == 0:
+            return np.zeros(0, np.int64)
+        # Events are in step order, so only rungs of the same or later steps matter
+        rungs = self.rungs[np.searchsorted(self.rungs['step'], eventSteps[0]):]
+        firstRung = len(self.rungs) - len(rungs)
+        eventLines = self.getLogLineNumbers(eventSteps, self.eventLine[start:])
+        rungFirstLines = self.getLogLineNumbers(rungs['step'], rungs['fromIndex'])
+        rungLastLines = self.getLogLineNumbers(rungs['step'], rungs['toIndex'])
+        rung = np.searchsorted(rungFirstLines, eventLines, side='right') - 1
+        inRung = rung >= 0
+        inRung[inRung] = eventLines[inRung] <= rungLastLines[rung[inRung]]
+        rung[inRung] += firstRung
+        rung[~inRung] = -1
+        return rung
+
+    # Returns the line numbers in the log of line indexes within big steps
+    def getLogLineNumbers(self, steps, indexes):
+        return self.stepFirstLine[steps - 1] + indexes
+
+    # Returns the RungIndex of each rung sub step of a big step, or of the
+    # whole log if step is None
+    def getRungIndexes(self, step=None):
+        if step is None:
+            rows = range(len(self.rungs))
+        else:
+            rows = range(np.searchsorted(self.rungs['step'], step, 'left'), np.searchsorted(self.rungs['step'], step, 'right'))
+        return [RungIndex(self.rungs, row) for row in rows]
+
+    # Returns (fromRung, toRung, gravityActive, gasActive) parsed from a line such as
+    #   'Rungs 0 to 3. Gravity Active: 1021611, Gas Active: 1021610'
+    # with gasActive -1 if the line has no Gas Active, or None if the line is
+    # not a rung line of this form.
+    def parseRungLine(self, line):
+        p = ChangaLog.RUNG_LINE.search(line)
+        if p is None:
+            return None
+        fromRung, toRung, gravityActive, gasActive = p.groups(-1)
+        return int(fromRung), int(toRung), int(gravityActive), int(gasActive)
+
+    # Returns the index of a phase axis in PHASES, as stored in eventPhase
+    def getPhaseId(self, axis):
+        for phase, definition in enumerate(ChangaLog.PHASES):
+            if definition.axis == axis:
+                return phase
+        raise KeyError(axis)
+
+    # Returns an array of the rows in the event columns of a phase axis
+    def getPhaseEvents(self, axis):
+        def compute(start, series):
+            firstEvent, firstRung = self.getStepStartRows(start)
+            return [np.flatnonzero(self.eventPhase[firstEvent:] == self.getPhaseId(axis)) + firstEvent]
+        return self.getGrowingSeries(('events', axis), lambda: [Column(np.int64)], compute)[0]
+
+    # Returns the sorted ids of the phases whose patterns are found in a line.
+    # A phase whose pattern is found within the text matched for another, like
+    # 'Calculating gravity' in 'Calculating gravity and SPH', is counted too.
+    @staticmethod
+    def getLinePhaseIds(line):
+        phases = []
+        for p in ChangaLog.PHASE_MATCHER.finditer(line):
+            text = p.group()
+            ids = ChangaLog.PHASE_IDS.get(text)
+            if ids is None:
+                ids = [phase for phase, definition in enumerate(ChangaLog.PHASES) if definition.matcher.search(text)]
+                ChangaLog.PHASE_IDS[text] = ids
+            phases.extend(ids)
+        if len(phases) > 1:
+            phases = sorted(set(phases))
+        return phases
+
+    # Returns a list of axis names that this log recognizes as plottable
+    def getAxes(self):
+        if self.isconsph:
+            return ChangaLog.CONSPH_AXES_LIST
+        else:
+            return ChangaLog.AXES_LIST
+
+    # Returns a dictionary of 4 lists, 'yData' is Y axis points, 
+    #                                  'xData' is X axis points, 
+    #                                  'xLabels' is X axis tick labels, 
+    #                                  'annotations' is point annotations, 
+    # for this log for the specified axis
+    def getData(self, axis, resolution):
+        yData = []
+        xData = []
+        xLabels = []
+        annotations = []
+        if resolution == 'Big step':
+            if axis == 'TotalStepTime':
+                yData = self.getAllStepsTimes()
+            else:
+                yData = self.getAllStepsKeywordTimes(axis)
+            xData = np.arange(1, len(yData) + 1)
+        elif resolution == 'Sub step':
+            obj = self.getRungs(axis)
+            yData = obj['yData']
+            xData = obj['xData']
+            xLabels = obj['xLabels']
+            annotations = obj['annotations']
+        return {'yData': yData, 'xData': xData, 'xLabels': xLabels, 'annotations': annotations}
+
+    # Returns [y, x],  where:
+    #   y ~= [
+    #   x ~= ['Rung 3 to 4']
+    # Rungs of each big step are listed in increasing order
+    def getSummedRungs(self, axis):
+        order, group, labels = self.getSummedRungGroups()
+        return {'yData': self.getSummedRungTimes(axis).tolist(), 'xData': labels}
+
+    # Returns an array with the time of a phase axis summed over the sub steps of
+    # each rung of each big step, in the order of getSummedRungs
+    def getSummedRungTimes(self, axis):
+        def compute(start, series):
+            order, group, labels = self.getSummedRungGroups()
+            firstEvent, firstRung = self.getStepStartRows(start)
+            # Rungs of the new big steps are sorted after the others
+            firstGroup = group[firstRung] if firstRung < len(group) else len(labels)
+            return [np.bincount(group[firstRung:] - firstGroup, weights=self.getRungTimes(axis)[order[firstRung:]],
+                                minlength=len(labels) - firstGroup)]
+        return self.getGrowingSeries(('summedRungs', axis), lambda: [Column(np.float64)], compute)[0]
+
+    # Returns (order, group, labels) of the summed rungs, the same for every axis:
+    # order sorts the rung columns by step and rung, group is the summed rung of
+    # each sorted row, and labels are the X axis labels of the summed rungs
+    def getSummedRungGroups(self):
+        return self.getGrowingSeries('summedRungGroups', lambda: [Column(np.int64), Column(np.int64), []],
+                                     self.findSummedRungGroups)
+
+    # Returns the rows of getSummedRungGroups for the big steps from row start
+    # on, given the rows of the big steps before them in series
+    def findSummedRungGroups(self, start, series):
+        firstEvent, firstRung = self.getStepStartRows(start)
+        rows = self.rungs[firstRung:]
+        # Stable sort by (step, rung), so the times of a rung are summed in log order
+        order = np.lexsort((rows['fromRung'], rows['step']))
+        steps = rows['step'][order]
+        rungs = rows['fromRung'][order]
+        isFirst = np.ones(len(order), dtype=bool)
+        isFirst[1:] = (steps[1:] != steps[:-1]) | (rungs[1:] != rungs[:-1])
+        group = np.cumsum(isFirst) - 1 + len(series[2])
+
+        labels = []
+        for step, key in zip(steps[isFirst].tolist(), rungs[isFirst].tolist()):
+            # If Rung 0 then label step number
+            xtick = ''
+            if key == 0:
+                xtick = 'Step ' + str(step) + ', Rung ' + str(key)
+            else:
+                xtick = 'Rung ' + str(key)
+            labels.append(xtick)
+        return order + firstRung, group, labels
+
+    # Returns an array with the time of a phase axis spent in each rung sub step,
+    # in the same order as the rung columns
+    def getRungTimes(self, axis):
+        return self.getGrowingSeries(('rungTimes', axis), lambda: [Column(np.float64)],
+                                     lambda start, series: [self.sumRungTimes(axis, start)])[0]
+
+    # Returns the time of a phase axis in each rung sub step of the big steps
+    # from row start on
+    def sumRungTimes(self, axis, start=0):
+        firstEvent, firstRung = self.getStepStartRows(start)
+        inPhase = self.eventPhase[firstEvent:] == self.getPhaseId(axis)
+        # Events of the big steps fall in their own rungs
+        eventRungs = self.getEventRungs()[firstEvent:][inPhase]
+        inRung = eventRungs >= 0
+        return np.bincount(eventRungs[inRung] - firstRung, weights=self.eventTime[firstEvent:][inPhase][inRung],
+                           minlength=len(self.rungs) - firstRung)
+
+    # Returns [y, x],  where:
+    #   y ~= [
+    #   x ~= ['Rung 3 to 4']
+    # axis: string of axis keyword
+    def getRungs(self, axis):
+        yData = self.getRungTimes(axis)
+        xData, xLabels, annotations = self.getRungLabels()
+        return {'yData': yData, 'xData': xData, 'xLabels': xLabels, 'annotations':annotations}
+
+    # Returns (xData, xLabels, annotations) of the rung sub steps, the same for every axis
+    def getRungLabels(self):
+        return self.getGrowingSeries('rungLabels', lambda: [Column(np.int64), [], []],
+                                     lambda start, series: self.findRungLabels(start))
+
+    # Returns the rows of getRungLabels for the big steps from row start on
+    def findRungLabels(self, start):
+        firstEvent, firstRung = self.getStepStartRows(start)
+        rows = self.rungs[firstRung:]
+        xData = np.arange(firstRung + 1, len(self.rungs) + 1)
+
+        # Make labels
+        # Rung 0 is last rung of step, so add step number to next step.
+        # Also add step number to very first label
+        xLabels = []
+        prevStep = -1
+        for step, fromRung, toRung in zip(rows['step'].tolist(), rows['fromRung'].tolist(), rows['toRung'].tolist()):
+            label = ''
+            if prevStep != step:
+                prevStep = step
+                label += 'Step ' + str(step) + ':  '
+            label += str(fromRung) + ' to ' + str(toRung)
+            xLabels.append(label)
+
+        annotations = [str(active) for active in rows['gravityActive'].tolist()]
+        return xData, xLabels, annotations
+
+
+    # Prints statistics for entire log, all from getStepStats and getTotalStats
+    # file object out: where to print them, stdout by default
+    # bool steps: print the stats of every big step before the totals
+    def printStats(self, out=None, steps=True):
+        if out is None:
+            out = sys.stdout
+        stepStats = self.getStepStats()
+        totalStats = self.getTotalStats()
+        numBigSteps = self.getNumBigSteps()
+        # Phase id, title in the step stats and title in the totals
+        phases = []
+        for phase, definition in enumerate(ChangaLog.PHASES):
+            if definition.axis in self.getAxes():
+                phases.append((phase, "  %-25s" % (definition.title + " time:"), "%-32s" % ("Total " + definition.title + " times:")))
+
+        # individual step stats
+        for row, (step, stepTime) in enumerate(zip(self.stepNumber.tolist(), self.stepTime.tolist())):
+            if not steps:
+                break
+            if step == 0:
+                print >>out, "Init:"
+            else:
+                print >>out, "Big step: ", step
+
+            for phase, title, totalTitle in phases:
+                print >>out, title,
+                printGroupStats(stepStats, phase * numBigSteps + row, out)
+
+            print >>out, "  Big step time (r):       ", stepTime
+    
+        # total stats
+        print >>out, " - - - - - - - - - -"
+        # subtract one for init
+        print >>out, "Total Big steps: ", numBigSteps
+
+        for phase, title, totalTitle in phases:
+            print >>out, totalTitle,
+            printGroupStats(totalStats, phase, out)
+        
+        print >>out, "Total Big Step (r) times:       ",
+        printGroupStats(totalStats, len(ChangaLog.PHASES), out)
+    
+        return
+
+    # Returns the stats of calcGroupedStats of the times of every phase in
+    # every big step, computed in one pass over the events. The stats of the
+    # phase with id phase in the big step at row step - 1 are at index
+    # phase * getNumBigSteps() + step - 1.
+    def getStepStats(self):
+        return self.getMemoized('stepStats', lambda: calcGroupedStats(
+            self.eventTime, self.eventPhase.astype(np.int64) * self.getNumBigSteps() + self.eventStep - 1,
+            len(ChangaLog.PHASES) * self.getNumBigSteps()))
+
+    # Returns the stats of calcGroupedStats of the total times of the big
+    # steps, at index phase for the total times of each phase, and at index
+    # len(PHASES) for the times reported for the big steps
+    def getTotalStats(self):
+        def compute():
+            numBigSteps = self.getNumBigSteps()
+            stepTotals = self.getStepStats()['sum']
+            values = np.concatenate((stepTotals, self.getAllStepsTimes()))
+            groups = np.repeat(np.arange(len(ChangaLog.PHASES) + 1), numBigSteps)
+            return calcGroupedStats(values, groups, len(ChangaLog.PHASES) + 1)
+        return self.getMemoized('totalStats', compute)
+
+    # Returns (lines, times), arrays of the line indexes and times of one
+    # phase axis within a single big step
+    def getStepKeywordTimes(self, step, axis):
+        # Events are stored in step order, so the step is a contiguous slice
+        offsets = self.getStepEventOffsets()
+        start, end = offsets[step - 1], offsets[step]
+        inPhase = self.eventPhase[start:end] == self.getPhaseId(axis)
+        return self.eventLine[start:end][inPhase], self.eventTime[start:end][inPhase]
+    
+    
+    ## LOGFILE ALL STEPS TOTALS ##
+        
+    # Returns an array of the total time of a phase axis in each big step
+    def getAllStepsKeywordTimes(self, keyword):
+        return self.getGrowingSeries(('stepTimes', keyword), lambda: [Column(np.float64)],
+                                     lambda start, series: [self.sumStepTimes(keyword, start)])[0]
+
+    # Returns the total time of a phase axis in each big step from row start on
+    def sumStepTimes(self, keyword, start=0):
+        firstEvent, firstRung = self.getStepStartRows(start)
+        inPhase = self.eventPhase[firstEvent:] == self.getPhaseId(keyword)
+        return np.bincount(self.eventStep[firstEvent:][inPhase] - 1 - start, weights=self.eventTime[firstEvent:][inPhase],
+                           minlength=self.getNumBigSteps() - start)
+ 
+    # Returns an array of the total time reported for each big step
+    def getAllStepsTimes(self):
+        return self.stepTime
+
+
+    ## QUERIES ##
+
+    # Returns the time of an axis in any part of the log, filtered by big step,
+    # rung and active particles, from indexes built once for all queries.
+    # tuple steps: (first, last) big steps
+    # tuple rungs: (lowest, highest) rungs of the sub steps, by the rung they
+    #              start from, as in getSummedRungs
+    # tuple active: (least, most) gravity active particles of the sub steps
+    # Ranges include both ends, and None leaves out a range or one of its ends.
+    # Filtering by rung or active particles leaves out the times before the
+    # first rung line of a big step, as the 'Sub step' resolution does.
+    # string by: None to return the total time, or 'step', 'rung' or 'substep'
+    #            to return {'yData': times, 'xData': x} with the time of each
+    #            big step, rung or sub step selected, x being their step
+    #            numbers, rungs or sub step numbers (as in getRungs)
+    # ex: gravity time on rungs 5 and up between big steps 400 and 600
+    #     logobject.query('GravityTimes', steps=(400, 600), rungs=(5, None))
+    def query(self, axis, steps=None, rungs=None, active=None, by=None):
+        if by not in [None, 'step', 'rung', 'substep']:
+            raise ValueError('cannot query by %s' % by)
+        firstStep, lastStep = getQueryBounds(steps, 1, self.getNumBigSteps())
+
+        # Whole big steps: running totals of the step times
+        if rungs is None and active is None and by in [None, 'step']:
+            if axis == 'TotalStepTime':
+                stepTimes = self.getAllStepsTimes()
+            else:
+                stepTimes = self.getAllStepsKeywordTimes(axis)
+            if by == 'step':
+                return {'yData': stepTimes[firstStep - 1:lastStep], 'xData': np.arange(firstStep, lastStep + 1)}
+            runningTimes = self.getMemoized(('runningStepTimes', axis), lambda: np.concatenate(([0.0], np.cumsum(stepTimes))))
+            return float(runningTimes[lastStep] - runningTimes[firstStep - 1])
+
+        if axis == 'TotalStepTime':
+            raise ValueError('TotalStepTime is only timed by big step')
+        offsets = self.getStepRungOffsets()
+        start, end = offsets[firstStep - 1], offsets[lastStep]
+        keys, rungStarts = self.getRungPostings()
+        lowRung, highRung = getQueryBounds(rungs, 0, len(rungStarts) - 2)
+        rungNumbers = np.arange(lowRung, highRung + 1)
+
+        # Rung ranges: running totals of the rung times of each rung
+        if active is None and by in [None, 'rung']:
+            runningTimes = self.getRungPostingTimes(axis)
+            first = np.searchsorted(keys, rungNumbers * len(self.rungs) + start)
+            last = np.searchsorted(keys, rungNumbers * len(self.rungs) + end)
+            rungTimes = runningTimes[last] - runningTimes[first]
+            if by == 'rung':
+                return {'yData': rungTimes, 'xData': rungNumbers}
+            return float(rungTimes.sum())
+
+        # Otherwise only the sub steps of the big steps selected are scanned
+        subSteps = self.rungs[start:end]
+        isSelected = (subSteps['fromRung'] >= lowRung) & (subSteps['fromRung'] <= highRung)
+        if active is not None:
+            leastActive, mostActive = getQueryBounds(active, 0, np.iinfo(np.int64).max)
+            isSelected &= (subSteps['gravityActive'] >= leastActive) & (subSteps['gravityActive'] <= mostActive)
+        rows = np.flatnonzero(isSelected)
+        times = self.getRungTimes(axis)[start:end][rows]
+        if by is None:
+            return float(times.sum())
+        elif by == 'substep':
+            return {'yData': times, 'xData': rows + start + 1}
+        elif by == 'step':
+            return {'yData': np.bincount(subSteps['step'][rows] - firstStep, weights=times, minlength=lastStep - firstStep + 1),
+                    'xData': np.arange(firstStep, lastStep + 1)}
+        return {'yData': np.bincount(subSteps['fromRung'][rows] - lowRung, weights=times, minlength=len(rungNumbers)),
+                'xData': rungNumbers}
+
+    # Returns the rows in the event columns of each big step: those of step
+    # s are from offsets[s - 1] to offsets[s]
+    def getStepEventOffsets(self):
+        return self.getMemoized('stepEventOffsets', lambda: np.searchsorted(self.eventStep, np.arange(1, self.getNumBigSteps() + 2)))
+
+    # Returns the rows in the rung columns of each big step, as getStepEventOffsets
+    def getStepRungOffsets(self):
+        return self.getMemoized('stepRungOffsets', lambda: np.searchsorted(self.rungs['step'], np.arange(1, self.getNumBigSteps() + 2)))
+
+    # Returns (keys, rungStarts), the rows of the rung sub steps listed by rung:
+    # keys are fromRung * len(rungs) + row of every sub step, sorted, so that
+    # those of rung r are from rungStarts[r] to rungStarts[r + 1], in log order
+    def getRungPostings(self):
+        def compute():
+            numRows = len(self.rungs)
+            keys = np.sort(self.rungs['fromRung'].astype(np.int64) * numRows + np.arange(numRows))
+            numRungs = int(self.rungs['fromRung'].max()) + 1 if numRows else 0
+            return keys, np.searchsorted(keys, np.arange(numRungs + 1) * numRows)
+        return self.getMemoized('rungPostings', compute)
+
+    # Returns the running totals of the time of a phase axis in the sub steps
+    # listed by getRungPostings, starting with 0
+    def getRungPostingTimes(self, axis):
+        def compute():
+            keys, rungStarts = self.getRungPostings()
+            rows = keys % max(len(self.rungs), 1)
+            return np.concatenate(([0.0], np.cumsum(self.getRungTimes(axis)[rows])))
+        return self.getMemoized(('rungPostingTimes', axis), compute)
+    
+
+
+
+    # Returns the number of big steps in the log
+    def getNumBigSteps(self):
+        return self.stepColumns['stepNumber'].size
+
+    def getNumSubSteps(self):
+        return np.count_nonzero(self.eventPhase == self.getPhaseId('GravityTimes'))
+    
+
+    def printAxesList(self):
+        print "Axes: ", ChangaLog.AXES_LIST
+        return
+  
+    
+# Timed phase of a big step, reported in the log by lines such as
+#   'Calculating gravity ... took 1.5 seconds'
+class Phase():
+    # Runs a phase is timed in
+    ALL_RUNS = 'all'
+    CONSPH_RUNS = 'consph'
+    NON_CONSPH_RUNS = 'non-consph'
+
+    # axis: axis name, such as 'GravityTimes'
+    # pattern: regular expression found in the lines timing the phase
+    # title: name of the phase in printStats
+    # runs: ALL_RUNS, CONSPH_RUNS or NON_CONSPH_RUNS
+    def __init__(self, axis, pattern, title, runs):
+        self.axis = axis
+        self.pattern = pattern
+        self.matcher = re.compile(pattern)
+        self.title = title
+        self.runs = runs
+
+# Adds a timed phase to ChangaLog.PHASES, and to the axis lists of the runs
+# it is timed in. Logs parsed before the phase is registered, including
+# cached ones, have no times for it.
+# Returns the Phase.
+def registerPhase(axis, pattern, title, runs=Phase.ALL_RUNS):
+    for definition in ChangaLog.PHASES:
+        if definition.axis == axis:
+            raise ValueError("Phase %s is already registered" % axis)
+    phase = Phase(axis, pattern, title, runs)
+    ChangaLog.PHASES.append(phase)
+    if runs != Phase.CONSPH_RUNS:
+        ChangaLog.AXES_LIST.append(axis)
+    if runs != Phase.NON_CONSPH_RUNS:
+        ChangaLog.CONSPH_AXES_LIST.append(axis)
+
+    patterns = sorted([definition.pattern for definition in ChangaLog.PHASES], key=len, reverse=True)
+    ChangaLog.PHASE_MATCHER = re.compile('|'.join(['(?:%s)' % pattern for pattern in patterns]))
+    ChangaLog.PHASE_IDS.clear()
+    return phase
+
+# Returns the title of an axis in printed stats: that of its phase, or
+# 'Big step (r)' for TotalStepTime
+def getAxisTitle(axis):
+    for definition in ChangaLog.PHASES:
+        if definition.axis == axis:
+            return definition.title
+    return 'Big step (r)'
+
+registerPhase('DomainDecompTimes', 'Domain decomposition', 'Domain Decomp')
+registerPhase('BalancerTimes', 'Load balancer', 'LB')
+registerPhase('BuildTreesTimes', 'Building trees', 'Build trees')
+registerPhase('ConsphTimes', 'Calculating gravity and SPH', 'Concurrent SPH', Phase.CONSPH_RUNS)
+registerPhase('GravityTimes', 'Calculating gravity', 'Gravity', Phase.NON_CONSPH_RUNS)
+registerPhase('DensityTimes', 'Calculating densities', 'Density', Phase.NON_CONSPH_RUNS)
+registerPhase('MarkNeighborTimes', 'Marking Neighbors', 'Mark Neighbor', Phase.NON_CONSPH_RUNS)
+registerPhase('DensityOfNeighborTimes', 'Density of Neighbors', 'Density of Neighbor', Phase.NON_CONSPH_RUNS)
+registerPhase('PressureGradientTimes', 'Calculating pressure gradients', 'Pressure Gradient', Phase.NON_CONSPH_RUNS)
+
+# Returns a dictionary identifying the current contents of a log file:
+#   path, size, mtime, and a hash of the first and last MB of the file.
+# Hashing only the ends keeps this fast on multi-GB logs, while still
+# catching a log that was rewritten within the same second.
+def getLogFingerprint(filename, blocksize=1<<20):
+    f = open(filename, 'rb')
+    try:
+        st = os.fstat(f.fileno())
+        sha = hashlib.sha1()
+        sha.update(f.read(blocksize))
+        if st.st_size > blocksize:
+            f.seek(max(blocksize, st.st_size - blocksize))
+            sha.update(f.read(blocksize))
+    finally:
+        f.close()
+    return { 'path' : os.path.abspath(filename),
+             'size' : st.st_size,
+             'mtime' : st.st_mtime,
+             'hash' : sha.hexdigest() }
+
+# Returns the name of the parse cache kept next to a log file
+def getCacheName(filename):
+    return filename + '.oldtimer.npz'
+
+# Errors of a parse cache that is missing, truncated or otherwise corrupt
+CACHE_READ_ERRORS = (IOError, ValueError, EOFError, zipfile.BadZipfile, zlib.error)
+
+# Returns whether a log file is empty or ends with a newline, so that no line
+# of it can still be being written
+def endsWithNewline(filename):
+    f = open(filename, 'rb')
+    try:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == '\n'
+    finally:
+        f.close()
+
+# Raised by a progress callback to stop parsing
+class ParseCancelled(Exception):
+    pass
+
+# Returns a ChangaLog for a log file, read from its parse cache when the
+# cache matches the file, otherwise parsed and written to the cache.
+# Raises EnvironmentError (IOError or OSError) if the log cannot be read.
+# bool verbose: report on the cache and the parse
+# int processes: number of processes parsing a large log, one per core by default
+# progress: see parseChangaLogParallel
+# bool final: the log is complete, see parseChangaLogParallel. A log being
+#             followed has its last line held back while it has no newline,
+#             and that partial parse is neither read from nor written to the
+#             cache, which holds parses of complete logs.
+def openChangaLog(filename, usecache=True, verbose=True, processes=None, progress=None, final=True):
+    if not final and not endsWithNewline(filename):
+        usecache = False
+    if usecache:
+        key = getLogFingerprint(filename)
+        logobject = ChangaLog()
+        if logobject.loadCache(getCacheName(filename), key):
+            if verbose:
+                print "Loaded cached parse of %s" % filename
+            return logobject
+
+    logobject = parseChangaLogParallel(filename, processes, progress=progress, final=final)
+    if verbose:
+        print "Parsed %s: %d big steps" % (filename, logobject.getNumBigSteps())
+        if logobject.malformedLines:
+            print "Skipped %d malformed rung lines, first at line %d" % (len(logobject.malformedLines), logobject.malformedLines[0] + 1)
+
+    if usecache:
+        try:
+            logobject.saveCache(getCacheName(filename), key)
+        except (IOError, OSError):
+            # Read-only directory etc: work without a cache
+            if verbose:
+                print "Cannot write parse cache for %s" % filename
+    return logobject
+
+# Smallest chunk of a log worth parsing in a separate process
+PARALLEL_CHUNK_SIZE = 32 << 20
+
+# Returns a ChangaLog parsed from a log file. A large log is split into chunks
+# at big step boundaries, which are parsed in a pool of processes and joined
+# back together; the result is the same as parsing the whole file in order.
+# int processes: number of processes, one per core by default
+# int chunksize: smallest chunk given to a process, in bytes
+# progress: called as progress(doneBytes, totalBytes) each time a chunk is
+#           parsed; it may raise ParseCancelled to stop parsing
+# bool final: the log is complete, so a last line without a newline is parsed;
+#             False for a log still being written, which may be mid-line
+def parseChangaLogParallel(filename, processes=None, chunksize=PARALLEL_CHUNK_SIZE, progress=None, final=True):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    size = os.path.getsize(filename)
+    # A few chunks per process, so that a slow chunk does not hold up the rest.
+    # Chunks are also the steps of progress, even with a single process.
+    numChunks = max(1, min(4 * processes, size // chunksize))
+    if numChunks > 1:
+        f = open(filename, 'rb')
+        try:
+            offsets = [0] + findBigStepBoundaries(f, size, numChunks) + [size]
+        finally:
+            f.close()
+    else:
+        offsets = [0, size]
+    # The last chunk ends the log, with or without a newline
+    tasks = [(filename, start, end, final and end == size) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    if processes <= 1 or len(tasks) == 1:
+        chunks = itertools.imap(parseChangaLogRange, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        chunks = imapQueued(pool, parseChangaLogRange, tasks, 2 * processes)
+    try:
+        logobject = None
+        for (filename, start, end, final), chunk in itertools.izip(tasks, chunks):
+            if logobject is None:
+                logobject = chunk
+            elif logobject.parseState.done:
+                # Past "Done." only the consph flag counts, as in a serial parse
+                logobject.isconsph = logobject.isconsph or chunk.isconsph
+            else:
+                logobject.appendLog(chunk)
+            if progress is not None:
+                progress(end, size)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return logobject
+
+# Returns byte offsets splitting a log file into about numChunks chunks, each
+# offset just past a 'Big step ... took' line, where a new big step starts
+# file object f: the log, opened in binary mode
+def findBigStepBoundaries(f, size, numChunks):
+    offsets = []
+    for chunk in range(1, numChunks):
+        target = size * chunk // numChunks
+        if offsets and target <= offsets[-1]:
+            continue
+        # Move to the first line starting at or after target
+        f.seek(target - 1)
+        f.readline()
+        line = f.readline()
+        while line and ChangaLog.RE_BIG_STEP_LINE not in line:
+            line = f.readline()
+        offset = f.tell()
+        if not line or offset >= size:
+            break
+        if not offsets or offset > offsets[-1]:
+            offsets.append(offset)
+    return offsets
+
+# Parses the lines of a log file between two byte offsets, in a worker process
+# of parseChangaLogParallel. Returns a ChangaLog with steps numbered from 1
+# and line numbers counted from start, as joined up by ChangaLog.appendLog.
+# bool final: end is the end of the file
+def parseChangaLogRange(args):
+    filename, start, end, final = args
+    # Binary mode, so that parse offsets are byte offsets in the file
+    f = open(filename, 'rb')
+    try:
+        logobject = ChangaLog()
+        logobject.parseState = ParseState(offset=start)
+        # mmap cannot map an empty file
+        if end > start:
+            buf = mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ)
+            try:
+                logobject.parseMapped(buf, start, end, final)
+            finally:
+                buf.close()
+    finally:
+        f.close()
+    return logobject
+
+# Opens one log for openChangaLogs, in a worker process.
+# Returns (index, ChangaLog, error), with a None ChangaLog and an error
+# message if the log could not be opened or parsed.
+def openChangaLogWorker(args):
+    index, filename, usecache, processes, final = args
+    try:
+        return index, openChangaLog(filename, usecache, False, processes, final=final), None
+    except (EnvironmentError, ValueError), e:
+        return index, None, str(e)
+
+# Opens many logs at once, parsing them in parallel in a pool of processes.
+# Returns a list of ChangaLogs in the order of filenames, with None for each
+# log that could not be opened.
+# int processes: number of worker processes, one per core by default
+# progress: called as progress(done, total, filename, error) each time a log is
+#           opened, with error None or a message if the log could not be opened;
+#           it may raise ParseCancelled to stop opening logs
+# bool final: the logs are complete, False to follow them, see openChangaLog
+def openChangaLogs(filenames, usecache=True, processes=None, progress=None, final=True):
+    logobjects = [None] * len(filenames)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    # A single log gets all the processes to parse it in chunks, otherwise
+    # there is one log per process
+    if len(filenames) <= 1 or processes <= 1:
+        tasks = [(index, filename, usecache, processes, final) for index, filename in enumerate(filenames)]
+        results = itertools.imap(openChangaLogWorker, tasks)
+        pool = None
+    else:
+        tasks = [(index, filename, usecache, 1, final) for index, filename in enumerate(filenames)]
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        results = imapQueued(pool, openChangaLogWorker, tasks, 2 * processes)
+    try:
+        for done, (index, logobject, error) in enumerate(results):
+            logobjects[index] = logobject
+            if progress is not None:
+                progress(done + 1, len(tasks), filenames[index], error)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return logobjects
+
+# Yields func(task) for each task in order, computed in a pool of processes
+# with at most numQueued tasks given to the pool at a time. If the caller
+# stops early, e.g. on ParseCancelled, closing and joining the pool only waits
+# for these tasks. (Pool.terminate cannot be used instead: it hangs when it
+# kills a worker in the middle of sending back a large ChangaLog.)
+def imapQueued(pool, func, tasks, numQueued):
+    queued = collections.deque()
+    for task in tasks:
+        queued.append(pool.apply_async(func, (task,)))
+        if len(queued) >= numQueued:
+            yield queued.popleft().get()
+    while queued:
+        yield queued.popleft().get()
+
+# Bytes of a mapped log scanned at a time by iterMappedLines
+MAPPED_BLOCK_SIZE = 16 << 20
+
+# Yields the lines of interest to ChangaLog.parseLines from the log mapped in
+# buf (an mmap, or any string), between two byte offsets at the start of lines.
+# Keywords of ChangaLog.SCAN_KEYWORDS are searched for in the bytes directly,
+# and newlines are counted with NumPy, so only the lines holding a keyword
+# (and the last line of each block) are copied out as strings.
+# Yields (skippedLines, skippedBytes, line) for each of these lines.
+# A final line without a newline may still be being written by a running
+# simulation, so it is left to be read once complete, unless final is set
+# because end is known to be the end of the log.
+def iterMappedLines(buf, start, end, blocksize=MAPPED_BLOCK_SIZE, final=False):
+    view = np.frombuffer(buf, np.uint8)
+    pos = start
+    while pos < end:
+        # Cut the block at its last newline, growing it for very long lines
+        blockEnd = min(end, pos + blocksize)
+        lineEnds = np.flatnonzero(view[pos:blockEnd] == ord('\n')) + (pos + 1)
+        while len(lineEnds) == 0 and blockEnd < end:
+            blockEnd = min(end, blockEnd + blocksize)
+            lineEnds = np.flatnonzero(view[pos:blockEnd] == ord('\n')) + (pos + 1)
+        if final and blockEnd == end and (len(lineEnds) == 0 or lineEnds[-1] < end):
+            lineEnds = np.append(lineEnds, end)
+        if len(lineEnds) == 0:
+            return
+        blockEnd = int(lineEnds[-1])
+
+        hits = [blockEnd - 1]
+        for keyword in ChangaLog.SCAN_KEYWORDS:
+            hit = buf.find(keyword, pos, blockEnd)
+            while hit != -1:
+                hits.append(hit)
+                hit = buf.find(keyword, hit + len(keyword), blockEnd)
+
+        # Lines holding a hit, and the lines and bytes skipped before each
+        lines = np.unique(np.searchsorted(lineEnds, hits, side='right'))
+        ends = lineEnds[lines]
+        starts = np.where(lines > 0, lineEnds[lines - 1], pos)
+        skippedLines = np.diff(np.concatenate(([-1], lines))) - 1
+        skippedBytes = starts - np.concatenate(([pos], ends[:-1]))
+        for numLines, numBytes, lineStart, lineEnd in itertools.izip(skippedLines.tolist(), skippedBytes.tolist(), starts.tolist(), ends.tolist()):
+            yield numLines, numBytes, buf[lineStart:lineEnd]
+        pos = blockEnd
+
+# Returns (low, high), a range of ChangaLog.query with its open ends set to
+# lowest and highest, and clipped to them
+def getQueryBounds(bounds, lowest, highest):
+    if bounds is None:
+        return lowest, highest
+    low, high = bounds
+    if low is None:
+        low = lowest
+    if high is None:
+        high = highest
+    # An empty range is (low, low - 1), to give empty slices
+    low = min(max(low, lowest), highest + 1)
+    high = max(min(high, highest), low - 1)
+    return low, high
+
+## CALCULATIONS ##
+
+# Percentiles computed by calcGroupedStats, as stats 'p50', 'p90', ...
+STAT_PERCENTILES = [50, 90, 99]
+
+# Returns statistics of numbers split into groups, all groups computed at once.
+# array values: the numbers
+# array groups: group of each number, from 0 to numGroups - 1
+# Returns a dict of arrays with an entry per group: 'count', 'sum', 'avg',
+# 'min', 'max', 'std' (of the population, as np.std) and 'pN' for each
+# percentile N of STAT_PERCENTILES (interpolated, as np.percentile).
+# Empty groups have a count and sum of 0, and NaN for the other stats.
+def calcGroupedStats(values, groups, numGroups):
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    count = np.bincount(groups, minlength=numGroups)
+    # Numbers are added in order, as the builtin sum would
+    total = np.bincount(groups, weights=values, minlength=numGroups).astype(np.float64)
+    isEmpty = count == 0
+    counted = np.where(isEmpty, 1, count)
+    avg = np.where(isEmpty, np.nan, total / counted)
+    deviations = values - avg[groups]
+    std = np.where(isEmpty, np.nan, np.sqrt(np.bincount(groups, weights=deviations * deviations, minlength=numGroups) / counted))
+
+    # Numbers sorted by group, then by value: each group is a sorted run
+    sortedValues = values[np.lexsort((values, groups))]
+    first = np.cumsum(count) - count
+    stats = { 'count' : count, 'sum' : total, 'avg' : avg, 'std' : std }
+    for name, fraction in [('min', 0.0), ('max', 1.0)] + [('p%d' % q, q / 100.0) for q in STAT_PERCENTILES]:
+        position = (counted - 1) * fraction
+        below = np.floor(position).astype(np.int64)
+        above = np.ceil(position).astype(np.int64)
+        if len(sortedValues):
+            low = sortedValues[np.minimum(first + below, len(sortedValues) - 1)]
+            high = sortedValues[np.minimum(first + above, len(sortedValues) - 1)]
+            stats[name] = np.where(isEmpty, np.nan, low + (high - low) * (position - below))
+        else:
+            stats[name] = np.full(numGroups, np.nan)
+    return stats
+
+# Prints a line with the stats of one group computed by calcGroupedStats
+#   sum, avg, min, max, std
+# int group: index of the group in the stats
+# file object out: where to print the line, stdout by default
+def printGroupStats(stats, group, out=None):
+    if out is None:
+        out = sys.stdout
+    if stats['count'][group] == 0:
+        print >>out, "No data"
+    else:
+        print >>out, float(stats['sum'][group]),
+        print >>out, "avg:", float(stats['avg'][group]),
+        print >>out, "min:", float(stats['min'][group]),
+        print >>out, "max:", float(stats['max'][group]),
+        print >>out, "std:", float(stats['std'][group])
+
+# Prints a line with stats about the numbers in the list
+#   sum, avg, min, max, std
+# list flist: a list or array of floats
+# file object out: where to print the line, stdout by default
+def printListStats(flist, out=None):
+    printGroupStats(calcGroupedStats(flist, np.zeros(len(flist), np.int64), 1), 0, out)
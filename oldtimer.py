@@ -1,42 +1,74 @@
 #!/usr/bin/python
 # oldtimer.py
 # Analyzes ChaNGa logs, prints statistics, and plots.
+# This is the GUI; parsing is in changalog.py and the headless
+# command line is oldtimer_cli.py.
 # Author: Ian Smith
 # 2011-08-22
 
 import pdb
 
 import sys
-import re
 import os
 import platform
 
 import matplotlib
+# Plots are drawn on a canvas embedded in the PySide window
+matplotlib.use('Qt4Agg')
+os.environ.setdefault('QT_API', 'pyside')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg, NavigationToolbar2QT
 
 import numpy as np
-import pylab as py
 
 # PySide imports
 from PySide.QtGui import *
 from ui_oldtimer import *
 
+from changalog import *
+from oldtimer_plot import *
+from oldtimer_compare import *
+
 #### begin GUI ####
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     DEFAULT_LOGNAME = "Log"
+    # Milliseconds between rereads of followed logs
+    FOLLOW_INTERVAL = 2000
 
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
         self.setupUi(self)
      
-        # List of openLog objects
-        self.openLogs = []
-
-        # List of bar plots, because py.bar() doesn't draw new bars next to preexisting data
-        self.barPlots = []
+        # openLog objects by log name
+        self.openLogs = LogStore()
+
+        # Canvas of the plots, docked next to the plot settings
+        self.canvas = PlotCanvas(self)
+        plotWidget = QWidget(self)
+        plotLayout = QVBoxLayout(plotWidget)
+        plotLayout.addWidget(self.canvas)
+        plotLayout.addWidget(NavigationToolbar2QT(self.canvas, plotWidget))
+        buttonClear = QPushButton('&Clear', plotWidget)
+        buttonClear.clicked.connect(self.canvas.clear)
+        plotLayout.addWidget(buttonClear)
+        self.plotDock = QDockWidget('Plot', self)
+        self.plotDock.setWidget(plotWidget)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.plotDock)
+
+        # Timer rereading followed logs
+        self.followTimer = QtCore.QTimer(self)
+        self.followTimer.timeout.connect(self.updateFollowedLogs)
+
+        # Thread parsing the logs being opened, and its progress dialog
+        self.loader = None
+        self.progressDialog = None
         
         # Setup menu actions
         self.action_Open.triggered.connect(self.openFile)
+        self.action_Follow.triggered.connect(self.followFile)
+        self.action_Stats.triggered.connect(self.printStats)
+        self.action_Compare.triggered.connect(self.compareSelection)
 
         # Setup button actions
         self.buttonPlot.clicked.connect(self.plot)
@@ -47,44 +79,115 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Set Axis combo to repopulate when Log combo is changed
         self.comboYLog.currentIndexChanged.connect(self.updateAxes)
 
+        # The current plot follows the plot settings
+        self.comboYAxis.currentIndexChanged.connect(self.updateCurrentPlot)
+        self.comboResolution.currentIndexChanged.connect(self.updateCurrentPlot)
+        self.checkBoxStep.toggled.connect(self.updateCurrentPlot)
+        self.checkBoxAnnotate.toggled.connect(self.updateCurrentPlot)
+
     def openFile(self):
+        filenames, filtr = QtGui.QFileDialog.getOpenFileNames(self)
+        if filenames:
+            self.loadFiles(filenames)
+
+    # Opens a log of a running simulation, and keeps reading what it appends
+    def followFile(self):
         filename, filtr = QtGui.QFileDialog.getOpenFileName(self)
         if filename:
-            self.loadFile(filename)
-
-    def loadFile(self, filename):
-        print "Opening %s..." % filename
-        try:
-            f = open(filename, 'r')
-        except IOError:
-            print "Cannot open %s" % filename
-        else:
-            logLines = f.readlines()
-            f.close()
-            # Create ChangaLog
-            logobject = ChangaLog(logLines)
-            # Add ChangaLog and other metadata to openLogs
-            self.openLogs.append( openLog(filename, self.getLogName(filename), logobject) )
-            # Update the mainwindow widgets to reflect new log
-            self.updateMainWindow()
+            self.loadFiles([filename], follow=True)
+
+    # Parses logs in a LogLoader thread, so that the window stays responsive.
+    # The logs are added by logsLoaded once they are all parsed.
+    # bool follow: keep reading what is appended to the logs
+    def loadFiles(self, filenames, follow=False):
+        if self.loader is not None:
+            QMessageBox.information(self, 'Open', 'Wait for the logs being opened')
+            return
+        self.progressDialog = QProgressDialog("Opening logs...", "Cancel", 0, LogLoader.PROGRESS_STEPS, self)
+        self.progressDialog.setWindowTitle('Open')
+        self.progressDialog.setMinimumDuration(0)
+        self.progressDialog.setValue(0)
+
+        self.loader = LogLoader(filenames, follow, self)
+        self.loader.progressed.connect(self.loadProgressed)
+        self.loader.loaded.connect(self.logsLoaded)
+        self.loader.finished.connect(self.loaderFinished)
+        self.progressDialog.canceled.connect(self.loader.cancel)
+        self.loader.start()
+
+    def loadProgressed(self, done, message):
+        if self.progressDialog is not None:
+            self.progressDialog.setLabelText(message)
+            self.progressDialog.setValue(int(done * LogLoader.PROGRESS_STEPS))
+
+    # Adds the logs parsed by the LogLoader to the window
+    # list results: (filename, ChangaLog, error) for each log, with a None
+    #               ChangaLog and an error message if it could not be opened
+    def logsLoaded(self, results, follow):
+        for filename, logobject, error in results:
+            if logobject is None:
+                print "Cannot open %s: %s" % (filename, error)
+                continue
+            # A single log is named by the user, many are named after their files
+            if len(results) == 1:
+                logname = self.getLogName(filename)
+            else:
+                logname = self.getUniqueLogName(filename)
+            log = openLog(filename, logname, logobject)
+            log.follow = follow
+            self.openLogs.add(logname, log)
+        # Update the mainwindow widgets to reflect new logs
+        self.updateMainWindow()
+        if self.openLogs:
             self.buttonPlot.setEnabled(True)
-           
-            # 
-            # TODO: Make a new textEdit for each opened log
-        #    self.textEdit1.insertPlainText(''.join(logLines))
+        if follow:
+            self.followTimer.start(MainWindow.FOLLOW_INTERVAL)
+
+    def loaderFinished(self):
+        if self.progressDialog is not None:
+            self.progressDialog.close()
+        self.progressDialog = None
+        self.loader = None
+
+    # Prints the statistics of the log selected in the Log combo
+    def printStats(self):
+        log = self.openLogs.get(self.comboYLog.currentText())
+        if log is not None:
+            print "Is consph?:", log.logobject.isconsph
+            log.logobject.printStats()
+
+    # Parses what was appended to followed logs, and updates their plots
+    def updateFollowedLogs(self):
+        for log in self.openLogs:
+            if not log.follow:
+                continue
+            try:
+                f = open(log.filename, 'rb')
+            except IOError:
+                continue
+            try:
+                newSteps = log.logobject.updateFromFile(f)
+            finally:
+                f.close()
+            if newSteps:
+                print "%s: %d new big steps" % (log.logname, newSteps)
+                for key in self.canvas.lines.keys():
+                    logname, axis, resolution = key
+                    if logname == log.logname:
+                        self.canvas.updateLine(key, log.logobject.getData(axis, resolution))
+                for key, bars in self.canvas.bars:
+                    logname, axis, resolution = key
+                    if logname == log.logname:
+                        self.canvas.updateBars(key, log.logobject.getSummedRungs(axis))
 
     def updateAxes(self, changalog):
         # Get selected log name from combo box
         # Find log object with that name
         # Redo combo axes with possible axes for that log
-        logname = self.comboYLog.currentText()
-        logobject = None
-        for log in self.openLogs:
-            if log.logname == logname:
-                logobject = log.logobject
-        if logobject is not None:
+        log = self.openLogs.get(self.comboYLog.currentText())
+        if log is not None:
             self.comboYAxis.clear()
-            self.comboYAxis.addItems(logobject.getAxes())
+            self.comboYAxis.addItems(log.logobject.getAxes())
 
     def updateMainWindow(self):
         self.comboYAxis.clear()
@@ -103,519 +206,309 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             prompt = os.path.basename(filename) + "\n\n" + 'Enter a name for this log: '
             name, ok = QInputDialog.getText(self, 'Log name', prompt)
             if ok and name:
-                if name in [log.logname for log in self.openLogs]:
+                if name in self.openLogs:
                     msgBox = QMessageBox()
                     msgBox.setText('Choose a unique name')
                     msgBox.exec_()
                 else:
                     goodname = True
         return name
+
+    # Returns the file name of a log, made unique among the open logs
+    def getUniqueLogName(self, filename):
+        name = os.path.basename(filename)
+        count = 1
+        while name in self.openLogs:
+            count += 1
+            name = '%s (%d)' % (os.path.basename(filename), count)
+        return name
     
+    # Adds a plot of the log, axis and resolution selected in the combo boxes
     def plot(self):
-        # Call createPlot with data points from logs and axes specified by comboboxes
-        points = [] 
+        self.drawSelection(True)
+
+    # Redraws the current plot, if any, with the plot settings just changed
+    def updateCurrentPlot(self, *args):
+        if self.canvas.current is not None:
+            self.drawSelection(False)
+
+    # Plots the log, axis and resolution selected in the combo boxes
+    # bool keep: add the plot to those shown, instead of replacing the current one
+    def drawSelection(self, keep):
         resolution = self.comboResolution.currentText()
         axisYName = self.comboYAxis.currentText()
         logYName = self.comboYLog.currentText()
-        #pdb.set_trace()
-        if resolution == 'Big step' or resolution == 'Sub step':
-            for log in self.openLogs:
-                if log.logname == logYName:
-                    points = log.logobject.getData(axisYName, resolution)
-
-#            if len(pointsY) != len(pointsX):
-#                msgBox = QMessageBox()
-#                msgBox.setText("Y and X axis data not of equal length\n\nY: " + str(len(pointsY)) + "\nX: " + str(len(pointsX)))
-#                msgBox.exec_()
-#                return
-
-            createPlot(points['yData'], points['xData'], points['xLabels'], points['annotations'], logYName + '.' + axisYName, resolution, self.checkBoxStep.isChecked(), self.checkBoxAnnotate.isChecked())
+        log = self.openLogs.get(logYName)
+        # The combos are empty while being refilled
+        if log is None or not axisYName:
+            return
+        logobject = log.logobject
 
+        key = (logYName, axisYName, resolution)
+        if resolution == 'Big step' or resolution == 'Sub step':
+            points = logobject.getData(axisYName, resolution)
+            self.canvas.showLine(key, points, logYName + '.' + axisYName, resolution, self.checkBoxStep.isChecked(), self.checkBoxAnnotate.isChecked(), keep)
         elif resolution == 'Summed rungs':
-            for log in self.openLogs:
-                if log.logname == logYName:
-                    points = log.logobject.getSummedRungs(axisYName)
-
-            createBarPlot(self.barPlots, points['yData'], points['xData'], logYName + '.' + axisYName, resolution)
-
+            points = logobject.getSummedRungs(axisYName)
+            self.canvas.showBars(key, points, logYName + '.' + axisYName, resolution, keep)
 
+    # Plots the speedups of the selected axis in every open log against the
+    # log selected in the Log combo, aligned by the selected resolution, and
+    # prints the speedups of every axis
+    def compareSelection(self):
+        resolution = self.comboResolution.currentText()
+        axisYName = self.comboYAxis.currentText()
+        baseName = self.comboYLog.currentText()
+        if len(self.openLogs) < 2 or not axisYName:
+            QMessageBox.information(self, 'Compare', 'Open two logs or more to compare them')
+            return
+        if resolution not in COMPARE_RESOLUTION_LIST:
+            QMessageBox.information(self, 'Compare', 'Logs are compared by ' + ' or '.join(COMPARE_RESOLUTION_LIST))
+            return
+        comparison = compareLogs(self.openLogs.names, [log.logobject for log in self.openLogs], resolution=resolution, base=baseName)
+        if axisYName not in comparison.axes:
+            QMessageBox.information(self, 'Compare', 'Not every log has ' + axisYName)
+            return
+        printComparison(comparison)
+
+        self.canvas.clear()
+        for name in comparison.names:
+            key = (name + ' / ' + baseName, axisYName, resolution)
+            points = comparison.getPoints(name, axisYName, 'speedups')
+            label = name + '.' + axisYName + ' speedup'
+            if resolution == 'Big step':
+                self.canvas.showLine(key, points, label, resolution, self.checkBoxStep.isChecked(), False, True)
+            else:
+                self.canvas.showBars(key, points, label, resolution, True)
+        self.canvas.axes.set_ylabel(QUANTITY_LABELS['speedups'])
+        # The plot settings now select plots of a single log again
+        self.canvas.current = None
+
+
+# Thread opening logs with openChangaLog(s), from their parse caches or by
+# parsing them. Signals are delivered to the GUI thread:
+# progressed(done, message) with done the fraction of the work done, and
+# loaded(results, follow) once all logs are open, unless cancel was called.
+class LogLoader(QtCore.QThread):
+    # Range of the progress dialog
+    PROGRESS_STEPS = 1000
+
+    progressed = QtCore.Signal(float, str)
+    loaded = QtCore.Signal(object, bool)
+
+    def __init__(self, filenames, follow=False, parent=None):
+        super(LogLoader, self).__init__(parent)
+        self.filenames = filenames
+        self.follow = follow
+        self.cancelled = False
+
+    # Stops parsing at the next chunk or log; nothing is loaded
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            if len(self.filenames) == 1:
+                results = [self.openOne(self.filenames[0])]
+            else:
+                results = self.openMany(self.filenames)
+        except ParseCancelled:
+            return
+        self.loaded.emit(results, self.follow)
+
+    # Returns (filename, ChangaLog, error) for a single log, which is parsed
+    # in chunks with all the cores
+    def openOne(self, filename):
+        def progress(doneBytes, totalBytes):
+            if self.cancelled:
+                raise ParseCancelled(filename)
+            self.progressed.emit(float(doneBytes) / totalBytes, "Parsing %s" % os.path.basename(filename))
+
+        self.progressed.emit(0.0, "Opening %s" % os.path.basename(filename))
+        try:
+            # A followed log may be mid-line, see openChangaLog
+            return filename, openChangaLog(filename, progress=progress, final=not self.follow), None
+        except (EnvironmentError, ValueError), e:
+            return filename, None, str(e)
+
+    # Returns (filename, ChangaLog, error) for each log, opening one log per core
+    def openMany(self, filenames):
+        errors = {}
+        def progress(done, total, filename, error):
+            if self.cancelled:
+                raise ParseCancelled(filename)
+            errors[filename] = error
+            self.progressed.emit(float(done) / total, "Opened %s" % os.path.basename(filename))
+
+        logobjects = openChangaLogs(filenames, progress=progress, final=not self.follow)
+        return [(filename, logobject, errors.get(filename)) for filename, logobject in zip(filenames, logobjects)]
 
 #### end GUI ####
-# Class RungIndex keeps info about a step on a rung, such as
-# the rung number from and to which the step is calculated, and the
-# line numbers of beginning and end of rung step in the log.
-class RungIndex:
-    def __init__(self):
-        self.fromRung = -1
-        self.toRung = -1
-        self.fromIndex = -1
-        self.toIndex = -1
-        self.gravityActive = -1
-        self.gasActive = -1
-        self.step = -1
-    def __repr__(self):
-        return "rung: " + str(self.fromRung) + " to " + str(self.toRung) + " from index " + str(self.fromIndex) + " to " + str(self.toIndex) + "(Gravity: " + str(self.gravityActive) + ")"
-
 # Struct containing metadata about an open log
 class openLog():
     def __init__(self, filename, logname, logobject):
         self.filename = filename
         self.logname = logname
         self.logobject = logobject
-
-class ChangaLog():
-
-    # Regex constants to search for key words in logfile
-    RE_RUNG_DISTRIBUTION = 'Rung distribution'
-    RE_DONE = 'Done.'
-    RE_BIG_STEP_LINE = 'Big step'
-    # Find number between 'took' and 'seconds'
-    RE_TOOK_SECONDS = '(?<=took.)([0-9]*\.?[0-9]+).(?=seconds)'
-    RE_BALANCER = 'Load balancer'
-    RE_BUILD_TREES = 'Building trees'
-    RE_GRAVITY = 'Calculating gravity'
-    RE_DENSITY = 'Calculating densities'
-    RE_MARK_NEIGHBOR = 'Marking Neighbors'
-    RE_DENSITY_OF_NEIGHBOR = 'Density of Neighbors'
-    RE_PRESSURE_GRADIENT = 'Calculating pressure gradients'
-    RE_DOMAIN_DECOMP = 'Domain decomposition'
-    # Step as first word on line
-    RE_SUB_STEP = '^Step:'
-    RE_GRAVITY_ACTIVE = '(?<=Gravity Active:.)([0-9]*\.?[0-9]+).'
-    RE_CONSPH = 'Calculating gravity and SPH' 
-
-    # Text that indicates if +consph is set
-    RE_ISCONSPH = 'Calculating gravity and SPH'
-
-    # List of Axes
-    AXES_LIST = ['TotalStepTime', 'DomainDecompTimes', 'BalancerTimes', 'BuildTreesTimes', 'GravityTimes', 'DensityTimes', 'MarkNeighborTimes', 'DensityOfNeighborTimes', 'PressureGradientTimes']
-    CONSPH_AXES_LIST = ['TotalStepTime', 'DomainDecompTimes', 'BalancerTimes', 'BuildTreesTimes', 'ConsphTimes']
-
-    # List of resolutions
-    RESOLUTION_LIST = ['Big step', 'Sub step', 'Summed rungs']
-
-
-    def __init__(self, loglines):
-        # Boolean indicating whether this log is for a +consph run
-        # consph runs don't have valid times for gravity, density, marking neighbors, pressure gradients, 
-        # or density of neighbors. But they do have a valid time for: calculating gravity and SPH
-        self.isconsph = self.findKeyword(loglines, ChangaLog.RE_ISCONSPH) is not None
-        print "Is consph?:", self.isconsph
-       
-        # Do parsing of entire log to build dictionary of times
-        self.parselog(loglines)
-
-
-    # Returns line of text from a list of lines containing first occurence of keyword, or None if not found
-    def findKeyword(self, lines, keyword):
-        for line in lines:
-            if keyword in line:
-                return line
-        return None
-
-
-    # Begins the parsing of a log file
-    # list fullLog: list of lines in logfile
-    # string logName: name of log
-    def parselog(self, loglines):
-        
-        # Break up log into list of Big steps
-        # Each bigStep is a dictionary, where 'logLines' contains all the text lines in that step
-        self.bigSteps = []
-        
-        for bigStepText in self.getBigStepsLines(loglines):
-            self.bigSteps.append( { 'LogLines' : bigStepText } )
-        
-        # Dictionary of stats and info calculated now, and stored for later use
-        for index, bigStep in enumerate(self.bigSteps):
-            bigStep['StepNumber'] = index + 1 # First big step is #1, not #0
-            bigStep['TotalStepTime'] = self.getStepTime(bigStep)
-            bigStep['DomainDecompTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_DOMAIN_DECOMP)
-            bigStep['BalancerTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_BALANCER)
-            bigStep['BuildTreesTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_BUILD_TREES)
-            if self.isconsph:
-                bigStep['ConsphTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_CONSPH)
-            else:
-                bigStep['GravityTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_GRAVITY)
-                bigStep['DensityTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_DENSITY)
-                bigStep['MarkNeighborTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_MARK_NEIGHBOR)
-                bigStep['DensityOfNeighborTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_DENSITY_OF_NEIGHBOR)
-                bigStep['PressureGradientTimes'] = self.getStepKeywordTimes(bigStep, ChangaLog.RE_PRESSURE_GRADIENT)
-
-            # Rung indexes stored as a list of rung objects
-            bigStep['RungIndexes'] = self.getRungIndexes(bigStep)    
-            #print bigStep['RungIndexes']
-#            print bigStep['GravityTimes']
-
-        self.printStats()
-    
-        #self.getCommand(bigSteps)
-    
-        return
-
-    # TODO: this is very dirty, clean up rung search
-    def getRungIndexes(self, bigStep):
-        rungIndexes = []
-        lastIdx = None
-        for i, line in enumerate(bigStep['LogLines']):
-            if "Rungs" in line:
-                # dirty part to fix
-                s, rungLine = line.split("Rungs")
-                rungLine.strip()
-                firstRung, secRung = rungLine.split("to")
-                secRung, s = secRung.split(".")
-                firstRung = int(firstRung)
-                secRung = int(secRung)
-                idx = RungIndex()
-                idx.step = bigStep['StepNumber']
-                idx.fromRung = firstRung
-                idx.toRung = secRung
-                idx.fromIndex = i
-                # Set active gravity particles
-                # ex:  Gravity Active: 1021611, Gas Active: 1021610
-                grav, gas = s.split(",")
-                s, grav = grav.split(":")
-                grav.strip()
-                idx.gravityActive = int(grav)
-                # TODO: set active gas particles
-                # Set the toIndex of the last RungIndex
-                if lastIdx is not None:
-                    lastIdx.toIndex = idx.fromIndex - 1
-                rungIndexes.append(idx)
-                lastIdx = idx
-            # If this is the last line then set the toIndex
-            if lastIdx is not None:
-                lastIdx.toIndex = i
-        return rungIndexes
-
-    # Returns a list of axis names that this log recognizes as plottable
-    def getAxes(self):
-        if self.isconsph:
-            return ChangaLog.CONSPH_AXES_LIST
+        # Whether the log is reread as the simulation appends to it
+        self.follow = False
+
+# Canvas embedded in the main window, showing the plots of the Plot button.
+# Plots are kept by key (logname, axis, resolution), so that drawing one again,
+# with other settings or with new data of a followed log, updates its artists
+# in place. The current plot is the one replaced when the settings change.
+# Lines and bars of summed rungs do not share an x axis, so showing one kind
+# clears the other.
+class PlotCanvas(FigureCanvasQTAgg):
+    def __init__(self, parent=None):
+        figure = Figure()
+        FigureCanvasQTAgg.__init__(self, figure)
+        self.setParent(parent)
+        self.axes = figure.add_subplot(111)
+        # Room for the rotated tick labels
+        figure.subplots_adjust(bottom=0.2)
+
+        # Line plots by key, as LODLines
+        self.lines = {}
+        # Bar plots as [key, bars], in the order they were drawn
+        self.bars = []
+        # Key of the current plot
+        self.current = None
+
+        # Lines and annotations are animated, that is left out of full redraws,
+        # so that they can be redrawn alone over the rest of the axes (blitting)
+        self.background = None
+        self.mpl_connect('draw_event', self.saveBackground)
+        # Lines have as many points as the axes are wide in pixels
+        self.mpl_connect('resize_event', self.updateLevelOfDetail)
+
+    # Removes all plots
+    def clear(self):
+        self.axes.clear()
+        self.lines = {}
+        self.bars = []
+        self.current = None
+        self.background = None
+        self.draw_idle()
+
+    # Shows a line plot
+    # dict points: as returned by ChangaLog.getData
+    # label, xlabel, dostep, doannotate: as for drawPlot
+    # bool keep: add the plot to those shown, instead of replacing the current one
+    def showLine(self, key, points, label, xlabel, dostep, doannotate, keep):
+        if self.bars:
+            self.clear()
+        if key not in self.lines and not keep and self.current in self.lines:
+            # Reuse the artists of the current plot
+            self.lines[key] = self.lines.pop(self.current)
+        self.current = key
+
+        if key not in self.lines:
+            plot = drawPlot(self.axes, points['yData'], points['xData'], points['xLabels'], points['annotations'], label, xlabel, dostep, doannotate)
+            plot.setAnimated(True)
+            self.lines[key] = plot
+            self.updateLegend()
+            self.draw_idle()
+            return
+
+        plot = self.lines[key]
+        changed = (plot.line.get_label() != label or plot.dostep != dostep or
+                   self.axes.get_xlabel() != xlabel)
+        plot.setStyle(label, dostep, doannotate)
+        self.axes.set_xlabel(xlabel)
+        self.updateLine(key, points, changed)
+
+    # Replaces the data of a line plot, e.g. after its log grew
+    # dict points: as returned by ChangaLog.getData
+    # bool changed: the legend or labels changed, so the whole canvas is redrawn
+    def updateLine(self, key, points, changed=False):
+        plot = self.lines[key]
+        limits = self.axes.viewLim.get_points().copy()
+        ticks = plot.shownTicks
+
+        plot.setPoints(points['yData'], points['xData'], points['xLabels'], points['annotations'])
+        autoscalePlots(self.axes, self.lines.values())
+        plot.update()
+
+        if changed:
+            self.updateLegend()
+        # Only the lines changed if the view and the ticks stayed the same
+        if (not changed and self.background is not None and ticks == plot.shownTicks and
+                np.array_equal(limits, self.axes.viewLim.get_points())):
+            self.blitLines()
         else:
-            return ChangaLog.AXES_LIST
-
-    # Returns a dictionary of 4 lists, 'yData' is Y axis points, 
-    #                                  'xData' is X axis points, 
-    #                                  'xLabels' is X axis tick labels, 
-    #                                  'annotations' is point annotations, 
-    # for this log for the specified axis
-    def getData(self, axis, resolution):
-        yData = []
-        xData = []
-        xLabels = []
-        annotations = []
-        if resolution == 'Big step':
-            if axis == 'TotalStepTime':
-                yData = self.getAllStepsTimes()
-            else:
-                yData = self.getAllStepsKeywordTimes(axis)
-            xData = np.arange(1, len(yData) + 1)
-        elif resolution == 'Sub step':
-            obj = self.getRungs(axis)
-            yData = obj['yData']
-            xData = obj['xData']
-            xLabels = obj['xLabels']
-            annotations = obj['annotations']
-        return {'yData': yData, 'xData': xData, 'xLabels': xLabels, 'annotations': annotations}
-
-    # Returns [y, x],  where:
-    #   y ~= [
-    #   x ~= ['Rung 3 to 4']
-    def getSummedRungs(self, axis):
-        y = []
-        x = []
-        rungsTimes = []
-        for step in self.bigSteps:
-            rungTime = {}
-            for rung in step['RungIndexes']:
-                if not rung.fromRung in rungTime:
-                    rungTime[rung.fromRung] = []
-                rungTime[rung.fromRung].append(self.getStepAxisTotalTimeBetweenIndexes(step, axis, rung.fromIndex, rung.toIndex))
-            #print step[axis]
-            #print step['RungIndexes']
-            for key in rungTime:
-                y.append(sum(rungTime[key]))
-                # If Rung 0 then label step number
-                xtick = ''
-                if key == 0:
-                    xtick = 'Step ' + str(step['StepNumber']) + ', Rung ' + str(key)
-                else:
-                    xtick = 'Rung ' + str(key)
-                x.append(xtick)
-        return {'yData': y, 'xData': x}
-    
-    def getStepAxisTotalTimeBetweenIndexes(self, step, axis, fromIndex, toIndex):
-        time = 0
-        for idx, subStepTime in step[axis]:
-            if idx >= fromIndex and idx <= toIndex:
-                time += subStepTime
-        return time
-
-    # Returns [y, x],  where:
-    #   y ~= [
-    #   x ~= ['Rung 3 to 4']
-    # axis: string of axis keyword
-    def getRungs(self, axis):
-        yData = []
-        xData = []
-        annotations = []
-        xLabels = []
-        rungList = []
-        for step in self.bigSteps:
-            for rung in step['RungIndexes']:
-                rungList.append(rung)
-                yData.append(self.getStepAxisTotalTimeBetweenIndexes(step, axis, rung.fromIndex, rung.toIndex))
-            
-        xData = np.arange(1, len(yData) + 1)
-        
-        # Make labels
-        # Rung 0 is last rung of step, so add step number to next step.
-        # Also add step number to very first label
-        prevStep = -1
-        for rung in rungList:
-            label = ''
-            if prevStep != rung.step:
-                prevStep = rung.step
-                label += 'Step ' + str(rung.step) + ':  '
-            label += str(rung.fromRung) + ' to ' + str(rung.toRung)
-            xLabels.append(label)
-
-        annotations = [str(rung.gravityActive) for rung in rungList]
-        return {'yData': yData, 'xData': xData, 'xLabels': xLabels, 'annotations':annotations}
-
-    def getSubStepsKeywordTimes(self, keyword):
-        timeList = []
-        labelList = []
-        annotationList = []
-        for step in self.bigSteps:
-            rungTime = {}
-            for rung in step['RungIndexes']:
-                if not rung.fromRung in rungTime:
-                    rungTime[rung.fromRung] = []
-                    rungTime[rung.fromRung].append(self.getStepAxisTotalTimeBetweenIndexes(step, axis, rung.fromIndex, rung.toIndex))
-
-
-
-#            for e in [num for idx, num in step[keyword]]:      # time is [1]
-#                print e
-#                timeList.append(e)
-        return [timeList, labelList, annotationList]
-
-
-    # Prints statistics for entire log
-    def printStats(self):
-        # individual step stats
-        for bigStep in self.bigSteps:
-            if bigStep['StepNumber'] == 0:
-                print "Init:"
-            else:
-                print "Big step: ", bigStep['StepNumber']
-     
-            print "  Domain Decomp time:      ", 
-            printListStats([num for idx, num in bigStep['DomainDecompTimes']])
-            
-            print "  LB time:                 ", 
-            printListStats([num for idx, num in bigStep['BalancerTimes']])
-            
-            print "  Build trees time:        ", 
-            printListStats([num for idx, num in bigStep['BuildTreesTimes']])
-
-            if self.isconsph:
-                print "  Concurrent SPH time:     ", 
-                printListStats([num for idx, num in bigStep['ConsphTimes']])
-
-            else:
-                print "  Gravity time:            ",
-                printListStats([num for idx, num in bigStep['GravityTimes']])
-     
-                print "  Density time:            ",
-                printListStats([num for idx, num in bigStep['DensityTimes']])
-       
-                print "  Mark Neighbor time:      ",
-                printListStats([num for idx, num in bigStep['MarkNeighborTimes']])
-              
-                print "  Density of Neighbor time:",
-                printListStats([num for idx, num in bigStep['DensityOfNeighborTimes']])
-              
-                print "  Pressure Gradient time:  ",
-                printListStats([num for idx, num in bigStep['PressureGradientTimes']])
-              
-            print "  Big step time (r):       ", bigStep['TotalStepTime']
-    
-        # total stats
-        print " - - - - - - - - - -"
-        # subtract one for init
-        print "Total Big steps: ", self.getNumBigSteps()
-    
-        print "Total Domain Decomp times:      ", 
-        printListStats(self.getAllStepsKeywordTimes('DomainDecompTimes'))
-            
-        print "Total LB times:                 ", 
-        printListStats(self.getAllStepsKeywordTimes('BalancerTimes'))
-            
-        print "Total Build trees times:        ", 
-        printListStats(self.getAllStepsKeywordTimes('BuildTreesTimes'))
-        if self.isconsph:
-            print "Total Concurrent SPH times:     ",
-            printListStats(self.getAllStepsKeywordTimes('ConsphTimes'))
+            self.draw_idle()
+
+    # Redraws the lines for the size of the axes in pixels
+    def updateLevelOfDetail(self, event):
+        for plot in self.lines.values():
+            plot.update()
+
+    # Shows a bar plot of summed rungs
+    # dict points: as returned by ChangaLog.getSummedRungs
+    # label, xlabel: as for drawBarPlot
+    # bool keep: add the plot to those shown, instead of replacing the current one
+    def showBars(self, key, points, label, xlabel, keep):
+        if self.lines:
+            self.clear()
+        keys = [barKey for barKey, bars in self.bars]
+        if key not in keys and not keep and self.current in keys:
+            # Take the place of the current plot
+            self.bars[keys.index(self.current)][0] = key
+        self.current = key
+        self.updateBars(key, points, label, xlabel)
+
+    # Replaces the heights of a bar plot, drawing it if it is not shown yet or
+    # if the number of rungs changed
+    # dict points: as returned by ChangaLog.getSummedRungs
+    # label, xlabel: as for drawBarPlot, None to keep them as they are
+    def updateBars(self, key, points, label=None, xlabel=None):
+        index = len(self.bars)
+        for i, (barKey, bars) in enumerate(self.bars):
+            if barKey == key:
+                index = i
+        if index < len(self.bars):
+            bars = self.bars[index][1]
+            if label is None:
+                label = bars.get_label()
+            if xlabel is None:
+                xlabel = self.axes.get_xlabel()
+            if updateBarPlot(bars, points['yData']):
+                bars.set_label(label)
+                self.axes.set_xlabel(xlabel)
+                self.updateLegend()
+                self.draw_idle()
+                return
+            bars.remove()
+        # Bars keep their place among the bars shown
+        bars = drawBarPlot(self.axes, index, points['yData'], points['xData'], label, xlabel)
+        if index < len(self.bars):
+            self.bars[index][1] = bars
         else:
-            print "Total Gravity times:            ",
-            printListStats(self.getAllStepsKeywordTimes('GravityTimes'))
-     
-            print "Total Density times:            ",
-            printListStats(self.getAllStepsKeywordTimes('DensityTimes'))
-       
-            print "Total Mark Neighbor times:      ",
-            printListStats(self.getAllStepsKeywordTimes('MarkNeighborTimes'))
-            
-            print "Total Density of Neighbor times:",
-            printListStats(self.getAllStepsKeywordTimes('DensityOfNeighborTimes'))
-            
-            print "Total Pressure Gradient times:  ",
-            printListStats(self.getAllStepsKeywordTimes('PressureGradientTimes'))
-        
-        print "Total Big Step (r) times:       ",
-        printListStats(self.getAllStepsTimes())
-    
-        return
-    
-    def getStepKeywordTimes(self, step, keyword):
-        timeList = []
-        for index, line in enumerate(step['LogLines']):
-            if keyword in line:
-                p = re.search(ChangaLog.RE_TOOK_SECONDS, line)
-                if p is not None:
-                    timeList.append([index, float(p.group())])
-        return timeList
-    
-    # Returns the total time reported for a single big step ('Big step 1 took 10.0 seconds')
-    def getStepTime(self, step):
-        for line in step['LogLines']:
-            if ChangaLog.RE_BIG_STEP_LINE in line:
-                p = re.search(ChangaLog.RE_TOOK_SECONDS, line)
-                if p is not None:
-                    return float(p.group())
-        return 0.0
-    
-    
-    ## LOGFILE ALL STEPS TOTALS ##
-        
-    # Returns total balancer time for list of steps                
-    def getAllStepsKeywordTimes(self, keyword):
-        timeList = []
-        for step in self.bigSteps:
-            timeList.append(calcSum([num for idx, num in step[keyword]]))
-        return timeList
- 
-   
-    def getAllStepsTimes(self):
-        timeList = []
-        for step in self.bigSteps:
-            timeList.append(self.getStepTime(step))
-        return timeList
-    
-
-
-
-    # Returns the number of big steps in the list of big steps
-    # list bigSteps: list of big step dictionaries
-    def getNumBigSteps(self):
-        return len(self.bigSteps)
-
-    def getNumSubSteps(self):
-        steps = 0
-        for step in self.bigSteps:
-            for e in step['GravityTimes']:
-                steps += 1
-        return steps
-    
-    # Returns a list of file objects where each object is a Big step
-    # list fullLog: list of lines in logfile
-    def getBigStepsLines(self, fullLog):
-        # bigSteps is a list of big steps
-        bigStepsLines = []
-        # bigStep is a list of lines in a single step
-        bigStep = []
-        
-        # TODO: add in small big step 0 (which is only rungs 0 to x)
-
-        for line in fullLog:
-            bigStep.append(line)
-            
-            if ChangaLog.RE_BIG_STEP_LINE in line:
-                bigStepsLines.append(tuple(bigStep))
-                bigStep = []
-            
-    
-            # "Done." signals the proper exit of ChaNGa
-            if ChangaLog.RE_DONE in line:
-                return bigStepsLines
-        
-        return bigStepsLines
-    
-    def printAxesList(self):
-        print "Axes: ", ChangaLog.AXES_LIST
-        return
-  
-    
-# Print the filename and other file info:
-#   number of lines
-# Returns with the file position reset to 0
-# file object f: file object
-def printTitle(f):
-    f.seek(0)
-    print f.name, ':'
-    print "Lines: ", repr(len(f.readlines())).rjust(3)
-    
-    print
-    f.seek(0)
-    return
-    
-
-def createPlot(dataY, dataX, ticksX, annotations, axisY, axisX, dostep, doannotate):
-    if not ticksX:
-        ticksX = dataX
-    
-    if dostep:
-        py.step(dataX, dataY, where='post', linestyle='-', label=axisY) # where=post steps after point
-    else:
-        py.plot(dataX, dataY, marker='o', ms=5.0, linestyle='-', label=axisY)
-    
-    if annotations and doannotate:
-        for note, x, y in zip(annotations, dataX, dataY):
-            py.annotate(note, (x, y), xytext=(2,2), xycoords='data', textcoords='offset points')
-
-    py.xticks(np.arange(1, len(dataX)+1), ticksX, horizontalalignment='left', rotation=30)
-    leg = py.legend()
-    leg.draggable()
-    py.xlabel(axisX)
-    py.ylabel('time (s)')
-
-    # Set X axis tick labels as rungs
-    #print zip(dataX, dataY)
-  
-    py.draw()
-    py.show()
-    
-    return
-
-def createBarPlot(plotList, dataY, dataX, axisY, axisX):
-    colorList = ['b', 'g', 'y', 'r', 'm', 'c', 'k']
-    width = 0.35
-    x = np.arange(len(dataY))
-    thisColor = colorList[len(plotList)%len(colorList)]
-    py.bar(x+(width-0.1)*len(plotList), dataY, width, color=thisColor, label=axisY)
-    py.xticks(x, dataX, rotation=30, size='small')
-    py.xlabel(axisX)
-    py.ylabel('time (s)')
-    leg = py.legend()
-    leg.draggable()
-    plotList.append([dataY, dataX, axisY, axisX])
-    py.draw()
-    py.show()
-#    py.close()
-    
+            self.bars.append([key, bars])
+        self.updateLegend()
+        self.draw_idle()
+
+    def updateLegend(self):
+        legend = self.axes.legend()
+        legend.draggable()
+
+    # Saves the axes without the animated artists after a full redraw, and
+    # draws the artists over them
+    def saveBackground(self, event):
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.drawLines()
+
+    def drawLines(self):
+        for plot in self.lines.values():
+            for artist in plot.getArtists():
+                self.axes.draw_artist(artist)
+
+    # Redraws only the lines over the saved background
+    def blitLines(self):
+        self.restore_region(self.background)
+        self.drawLines()
+        self.blit(self.axes.bbox)
 
 #def getCommand(bigSteps):
 #    print
@@ -646,48 +539,6 @@ def createBarPlot(plotList, dataY, dataX, axisY, axisX):
 #                plotNum += 1
 #    return
 
-## CALCULATIONS ##
-
-# Prints a line with stats about the numbers in the list
-#   min, max, avg, sigma
-# list : a list of floats
-def printListStats(flist):
-    if len(flist) == 0:
-        print "No data"
-        return
-    else:
-        print calcSum(flist),
-        print "avg:", calcAverage(flist),
-        print "min:", calcMin(flist),
-        print "max:", calcMax(flist),
-        print "std:", calcStd(flist)
-
-# Returns average of a list of floats
-def calcAverage(flist):
-    if not list:
-        return 0.0
-    return np.mean(flist)
-
-def calcSum(flist):
-    if not list:
-        return 0.0
-    return sum(flist)
-
-def calcMin(flist):
-    if not list:
-        return 0.0
-    return min(flist)
-
-def calcMax(flist):
-    if not list:
-        return 0.0
-    return max(flist)
-
-def calcStd(flist):
-    if not list:
-        return 0.0
-    return np.std(flist)
-
 #### MAIN ####
 
 def main(*args):
@@ -696,20 +547,7 @@ def main(*args):
     mw.show()
     app.exec_()
 
-   # # get logfile names list from command line
-   # logFiles = args[1:]
-
-   # for logFile in logFiles:
-   #     try:
-   #         f = open(logFile, 'r')
-   #     except IOError:
-   #         print 'Cannot open', logFile
-   #     else:
-   #         printTitle(f)
-   #         fullLog = f.readlines()
-   #         f.close()
-   #         
-   #         parseLog(fullLog)
+    # Logs are analyzed from the command line with oldtimer_cli.py
 
 
 if __name__ == '__main__':
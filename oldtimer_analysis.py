@@ -0,0 +1,196 @@
+# oldtimer_analysis.py
+# Analyzes how the time of each phase of a ChaNGa log scales with the number
+# of active particles of its sub steps, to spot load balancing and tree walk
+# problems: fits time = fixed + cost * active for every phase by least
+# squares, over all sub steps or over those of each rung, and finds the sub
+# steps far slower or faster than their fit.
+# Needs only NumPy, like changalog.py.
+
+import sys
+
+import numpy as np
+
+from changalog import *
+
+# Active particle counts are fitted in millions, to keep the normal
+# equations well conditioned
+ACTIVE_SCALE = 1e6
+# Residual, in standard deviations of its fit, beyond which a sub step is an outlier
+OUTLIER_SIGMAS = 3.0
+
+# Fits of the time of phases against the active particles of the sub steps
+# of a log, computed by fitActiveScaling.
+# Arrays are indexed by [group, axis]: a group is a rung with byRung, or else
+# the only group holds all sub steps.
+class ActiveScaling():
+    def __init__(self, axes, rungNumbers, useGas, coefficients, count, total, sigma, r2, rowGroups, residuals):
+        self.axes = axes
+        # Rung of each group, None for a fit of all sub steps
+        self.rungNumbers = rungNumbers
+        self.useGas = useGas
+        # Seconds of a sub step without active particles
+        self.fixed = coefficients[:, 0, :]
+        # Seconds per active particle
+        self.cost = coefficients[:, 1, :] / ACTIVE_SCALE
+        # Seconds per active gas particle, on top of cost, with useGas
+        self.gasCost = coefficients[:, 2, :] / ACTIVE_SCALE if useGas else None
+        # Sub steps fitted, their total time, residual standard deviation in seconds, and R^2
+        self.count = count
+        self.total = total
+        self.sigma = sigma
+        self.r2 = r2
+        # Group of each sub step, and residual of each sub step and axis in seconds
+        self.rowGroups = rowGroups
+        self.residuals = residuals
+
+    # Returns the residuals of the sub steps in standard deviations of their fit
+    def getResidualSigmas(self):
+        sigma = self.sigma[self.rowGroups]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(sigma > 0, self.residuals / sigma, 0.0)
+
+    # Returns (rows, axes, sigmas) of the sub steps whose time in an axis is
+    # more than threshold standard deviations away from its fit, the farthest
+    # first: their rows in the rung columns, the index of the axis, and the
+    # residual in standard deviations
+    def findOutliers(self, threshold=OUTLIER_SIGMAS):
+        sigmas = self.getResidualSigmas()
+        rows, axes = np.nonzero(np.abs(sigmas) > threshold)
+        sigmas = sigmas[rows, axes]
+        order = np.argsort(-np.abs(sigmas), kind='mergesort')
+        return rows[order], axes[order], sigmas[order]
+
+# Returns the active particle columns fitted for the sub steps of a log: the
+# gravity active particles and, with useGas, the gas active particles
+def getActiveColumns(logobject, useGas):
+    rungs = logobject.rungs
+    columns = [rungs['gravityActive'] / ACTIVE_SCALE]
+    if useGas:
+        if np.any(rungs['gasActive'] < 0):
+            raise ValueError('the rung lines of the log have no Gas Active counts')
+        columns.append(rungs['gasActive'] / ACTIVE_SCALE)
+    return np.column_stack(columns)
+
+# Returns the ActiveScaling of phases of a log, fitting the time of each
+# phase in each sub step to its active particles by least squares.
+# All phases and groups are fitted at once: the active particles of each
+# group are centred on their mean, so that the fixed time drops out of the
+# normal equations, whose sums over the sub steps of every group are made
+# with bincount and solved together. A group whose active particles do not
+# vary, such as a rung whose sub steps all have every particle active, has
+# no cost: its cost and fixed time are NaN, and its fit is its mean time.
+# list axes: phase axes fitted, all those of the log by default
+# bool byRung: fit the sub steps of each rung (the rung they start from) apart
+# bool useGas: fit the gas active particles too
+def fitActiveScaling(logobject, axes=None, byRung=False, useGas=False):
+    if axes is None:
+        axes = [axis for axis in logobject.getAxes() if axis != 'TotalStepTime']
+    rungs = logobject.rungs
+    x = getActiveColumns(logobject, useGas)
+    y = np.zeros((len(rungs), len(axes)))
+    for index, axis in enumerate(axes):
+        y[:, index] = logobject.getRungTimes(axis)
+    numColumns = x.shape[1]
+    if byRung:
+        rowGroups = rungs['fromRung'].astype(np.int64)
+        rungNumbers = range(int(rowGroups.max()) + 1 if len(rowGroups) else 0)
+    else:
+        rowGroups = np.zeros(len(rungs), np.int64)
+        rungNumbers = [None]
+    numGroups = len(rungNumbers)
+
+    def groupSums(weights):
+        return np.bincount(rowGroups, weights=weights, minlength=numGroups).astype(np.float64)
+
+    count = np.bincount(rowGroups, minlength=numGroups)
+    sizes = np.maximum(count, 1).astype(np.float64)
+    xMeans = np.column_stack([groupSums(x[:, i]) / sizes for i in range(numColumns)])
+    yMeans = np.column_stack([groupSums(y[:, axis]) / sizes for axis in range(len(axes))])
+    xc = x - xMeans[rowGroups]
+    yc = y - yMeans[rowGroups]
+
+    xtx = np.empty((numGroups, numColumns, numColumns))
+    xty = np.empty((numGroups, numColumns, len(axes)))
+    for i in range(numColumns):
+        for j in range(numColumns):
+            xtx[:, i, j] = groupSums(xc[:, i] * xc[:, j])
+        for axis in range(len(axes)):
+            xty[:, i, axis] = groupSums(xc[:, i] * yc[:, axis])
+    # Active particles are whole, so a column that varies by one particle or
+    # more within a group has a sum of squares of at least half a particle
+    # squared; below that it is the rounding of the mean
+    varies = np.diagonal(xtx, axis1=1, axis2=2) > 0.25 / ACTIVE_SCALE ** 2
+    outside = ~(varies[:, :, None] & varies[:, None, :])
+    xtx[outside] = 0
+    xty[~varies] = 0
+    # The pseudo-inverse splits the cost between gravity and gas active
+    # particles that vary together
+    slopes = np.matmul(np.linalg.pinv(xtx, rcond=1e-10), xty)
+
+    predicted = yMeans[rowGroups].copy()
+    for i in range(numColumns):
+        predicted += xc[:, i:i + 1] * slopes[rowGroups, i, :]
+    residuals = y - predicted
+
+    coefficients = np.empty((numGroups, numColumns + 1, len(axes)))
+    coefficients[:, 1:, :] = np.where(varies[:, :, None], slopes, np.nan)
+    coefficients[:, 0, :] = yMeans - (xMeans[:, :, None] * slopes).sum(axis=1)
+    coefficients[~varies[:, 0], 0, :] = np.nan
+
+    squaredResiduals = np.zeros((numGroups, len(axes)))
+    squaredDeviations = np.zeros((numGroups, len(axes)))
+    for axis in range(len(axes)):
+        squaredResiduals[:, axis] = groupSums(residuals[:, axis] ** 2)
+        squaredDeviations[:, axis] = groupSums(yc[:, axis] ** 2)
+    # Degrees of freedom left: the mean, and a cost per varying column
+    freedom = np.maximum(count - 1 - varies.sum(axis=1), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.sqrt(squaredResiduals / freedom[:, None])
+        r2 = np.where(squaredDeviations > 0, 1 - squaredResiduals / squaredDeviations, np.nan)
+    return ActiveScaling(axes, rungNumbers, useGas, coefficients, count, yMeans * count[:, None], sigma, r2, rowGroups, residuals)
+
+# Returns a fitted value printed in a field of width, 'undefined' for NaN
+def formatFitted(value, width):
+    if np.isnan(value):
+        return "%*s" % (width, "undefined")
+    return "%*.6f" % (width, value)
+
+# Prints the fits of an ActiveScaling: fixed time, cost per active particle and
+# R^2 of each phase timed, for each rung with byRung. Costs are undefined for
+# groups whose active particles do not vary.
+# file object out: where to print them, stdout by default
+def printActiveScaling(scaling, out=None):
+    if out is None:
+        out = sys.stdout
+    print >>out, "Time against active particles (time = fixed + cost * active):"
+    header = "%-30s %12s %18s" % ("", "fixed (s)", "cost (us/particle)")
+    if scaling.useGas:
+        header += " %14s" % "gas (us/part.)"
+    print >>out, header + " %8s %10s" % ("R^2", "sub steps")
+    for group, rung in enumerate(scaling.rungNumbers):
+        if scaling.count[group] == 0:
+            continue
+        if rung is not None:
+            print >>out, "Rung %d:" % rung
+        for index, axis in enumerate(scaling.axes):
+            if scaling.total[group, index] == 0:
+                continue
+            line = "  %-28s %s %s" % (getAxisTitle(axis) + ":", formatFitted(scaling.fixed[group, index], 12),
+                                      formatFitted(1e6 * scaling.cost[group, index], 18))
+            if scaling.useGas:
+                line += " " + formatFitted(1e6 * scaling.gasCost[group, index], 14)
+            print >>out, line + " %8.3f %10d" % (scaling.r2[group, index], scaling.count[group])
+
+# Prints the sub steps whose time is farthest from the fit of an ActiveScaling
+# int limit: most sub steps printed
+def printOutliers(logobject, scaling, threshold=OUTLIER_SIGMAS, limit=20, out=None):
+    if out is None:
+        out = sys.stdout
+    rows, axes, sigmas = scaling.findOutliers(threshold)
+    print >>out, "Sub steps over %g standard deviations from their fit: %d" % (threshold, len(rows))
+    rungs = logobject.rungs
+    for row, axis, sigma in zip(rows[:limit].tolist(), axes[:limit].tolist(), sigmas[:limit].tolist()):
+        time = logobject.getRungTimes(scaling.axes[axis])[row]
+        print >>out, "  Step %d, rungs %d to %d, %d active: %s %g s, fit %g s (%+.1f sigma)" % (
+            rungs['step'][row], rungs['fromRung'][row], rungs['toRung'][row], rungs['gravityActive'][row],
+            getAxisTitle(scaling.axes[axis]), time, time - scaling.residuals[row, axis], sigma)
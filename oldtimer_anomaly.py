@@ -0,0 +1,207 @@
+# oldtimer_anomaly.py
+# Finds the anomalous big steps of ChaNGa logs, such as load balancer churn,
+# domain decomposition spikes or node hiccups: the time of each phase in a
+# big step is compared with the median of its last big steps, in units of
+# their median absolute deviation (MAD), which a few slow steps do not skew.
+# The detector is streaming: the big steps are fed one at a time, so it
+# works on a whole log as well as on a log followed while it is written.
+# Needs only NumPy, like changalog.py.
+
+import sys
+import bisect
+import collections
+
+import numpy as np
+
+from changalog import *
+
+# Big steps of the rolling window each one is compared with
+ANOMALY_WINDOW = 50
+# Scaled MADs above the median beyond which a big step is anomalous
+ANOMALY_THRESHOLD = 5.0
+# Seconds above the median under which a big step is never anomalous, so
+# that phases usually taking no time, with a MAD of 0, are not all flagged
+ANOMALY_MIN_SECONDS = 0.01
+# Big steps in the window before any is flagged
+ANOMALY_MIN_STEPS = 10
+# Consecutive anomalous big steps of a phase making a regression rather
+# than a spike
+REGRESSION_STEPS = 3
+# Scales the MAD to the standard deviation of normally distributed times
+MAD_SCALE = 1.4826
+
+# Median and median absolute deviation of the last values added.
+# The window is kept sorted as well as in order, so each value added costs a
+# binary search and a shift of the sorted window, and the median and MAD are
+# read from it without a sort: O(log window) comparisons per value, however
+# long the series.
+class RollingMedian():
+    def __init__(self, window=ANOMALY_WINDOW):
+        self.window = window
+        # Values in the order added, and the same values sorted
+        self.values = collections.deque()
+        self.sorted = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        self.values.append(value)
+        bisect.insort(self.sorted, value)
+        if len(self.values) > self.window:
+            oldest = self.values.popleft()
+            del self.sorted[bisect.bisect_left(self.sorted, oldest)]
+
+    def getMedian(self):
+        n = len(self.sorted)
+        if n == 0:
+            return None
+        return 0.5 * (self.sorted[(n - 1) // 2] + self.sorted[n // 2])
+
+    # Returns the median of the distances of the values from their median.
+    # The values below the median, read backwards, and those from the median
+    # up are two runs of sorted distances, so the middle distances are found
+    # by a binary search over both runs (see getSmallestDistance).
+    # float median: the median, if already known
+    def getMad(self, median=None):
+        n = len(self.sorted)
+        if n == 0:
+            return None
+        if median is None:
+            median = self.getMedian()
+        split = bisect.bisect_left(self.sorted, median)
+        return 0.5 * (self.getSmallestDistance(median, split, (n - 1) // 2) +
+                      self.getSmallestDistance(median, split, n // 2))
+
+    # Returns the k-th smallest (from 0) distance from median of the values,
+    # of which those before index split are below the median
+    def getSmallestDistance(self, median, split, k):
+        s = self.sorted
+        numBelow = split
+        numAbove = len(s) - split
+        # i distances taken from below the median, k + 1 - i from above
+        low = max(0, k + 1 - numAbove)
+        high = min(k + 1, numBelow)
+        while True:
+            i = (low + high) // 2
+            j = k + 1 - i
+            if i < numBelow and j > 0 and s[split + j - 1] - median > median - s[split - 1 - i]:
+                low = i + 1
+            elif i > 0 and j < numAbove and median - s[split - i] > s[split + j] - median:
+                high = i - 1
+            else:
+                break
+        distance = 0.0
+        if i > 0:
+            distance = median - s[split - i]
+        if j > 0:
+            distance = max(distance, s[split + j - 1] - median)
+        return distance
+
+
+# A big step whose time in an axis is anomalous
+class StepAnomaly():
+    def __init__(self, axis, row, step, time, median, mad, run):
+        self.axis = axis
+        # Row of the big step in the step columns, and its number
+        self.row = row
+        self.step = step
+        # Time of the axis in the big step, and median and MAD of the window before it
+        self.time = time
+        self.median = median
+        self.mad = mad
+        # Consecutive anomalous big steps of the axis up to this one
+        self.run = run
+
+    # Returns how far above the median the time is, in scaled MADs
+    def getScore(self):
+        if self.mad > 0:
+            return (self.time - self.median) / (MAD_SCALE * self.mad)
+        return float('inf')
+
+    def isRegression(self):
+        return self.run >= REGRESSION_STEPS
+
+
+# Flags the anomalous big steps of a log, reading the big steps it has not
+# read yet each time update is called: all of them for a log parsed whole,
+# the new ones for a followed log.
+# Each axis has a RollingMedian of its last big steps, and a big step is
+# anomalous in an axis when its time is over threshold scaled MADs above
+# their median, and over minSeconds above it. The window holds the big steps
+# before the one compared, anomalous ones included, so that it follows a
+# lasting change after half a window.
+class AnomalyDetector():
+    # list axes: axes of the big steps watched, e.g. ChangaLog.getAxes()
+    def __init__(self, axes, window=ANOMALY_WINDOW, threshold=ANOMALY_THRESHOLD, minSeconds=ANOMALY_MIN_SECONDS,
+                 minSteps=ANOMALY_MIN_STEPS):
+        self.axes = list(axes)
+        self.window = window
+        self.threshold = threshold
+        self.minSeconds = minSeconds
+        self.minSteps = min(minSteps, window)
+        self.medians = dict([(axis, RollingMedian(window)) for axis in self.axes])
+        # Consecutive anomalous big steps of each axis so far
+        self.runs = dict([(axis, 0) for axis in self.axes])
+        # Big steps read
+        self.numSteps = 0
+
+    # Compares the times of the axes in one big step with the window, then
+    # adds them to it. Returns the list of StepAnomaly of the big step.
+    # list times: time of each axis, in the order of axes
+    def addStep(self, row, step, times):
+        anomalies = []
+        for axis, time in zip(self.axes, times):
+            medians = self.medians[axis]
+            isAnomalous = False
+            if len(medians) >= self.minSteps:
+                median = medians.getMedian()
+                # The MAD is only needed above the median
+                if time - median > self.minSeconds:
+                    mad = medians.getMad(median)
+                    isAnomalous = time - median > self.threshold * MAD_SCALE * mad
+            if isAnomalous:
+                self.runs[axis] += 1
+                anomalies.append(StepAnomaly(axis, row, step, time, median, mad, self.runs[axis]))
+            else:
+                self.runs[axis] = 0
+            medians.add(time)
+        self.numSteps += 1
+        return anomalies
+
+    # Reads the big steps of a log not read yet. Returns the list of
+    # StepAnomaly found in them, in step order.
+    def update(self, logobject):
+        start = self.numSteps
+        if logobject.getNumBigSteps() <= start:
+            return []
+        # The step totals of a followed log are only summed for its new big steps
+        series = []
+        for axis in self.axes:
+            if axis == 'TotalStepTime':
+                times = logobject.getAllStepsTimes()
+            else:
+                times = logobject.getAllStepsKeywordTimes(axis)
+            series.append(times[start:].tolist())
+        anomalies = []
+        for index, step in enumerate(logobject.stepNumber[start:].tolist()):
+            anomalies.extend(self.addStep(start + index, step, [times[index] for times in series]))
+        return anomalies
+
+
+# Returns one line describing a StepAnomaly
+def formatAnomaly(anomaly):
+    line = "Step %d: %s %g s, median %g s (+%.1f MADs)" % (anomaly.step, getAxisTitle(anomaly.axis), anomaly.time,
+                                                         anomaly.median, anomaly.getScore())
+    if anomaly.isRegression():
+        line += ", slow for %d big steps" % anomaly.run
+    return line
+
+# Prints the anomalies found by an AnomalyDetector
+# file object out: where to print them, stdout by default
+def printAnomalies(anomalies, detector, out=None):
+    if out is None:
+        out = sys.stdout
+    print >>out, "Big steps over %g MADs above the median of the last %d: %d" % (detector.threshold, detector.window, len(anomalies))
+    for anomaly in anomalies:
+        print >>out, "  " + formatAnomaly(anomaly)
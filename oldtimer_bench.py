@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# oldtimer_bench.py
+# Benchmarks the ChangaLog parser on synthetic ChaNGa logs: parse throughput,
+# peak memory, and the latency of the data accessors used for plotting.
+# Results are saved as JSON, and can be compared with an earlier run to catch
+# regressions.
+#
+# ex:  oldtimer_bench.py -o before.json
+#      (change changalog.py)
+#      oldtimer_bench.py -o after.json --compare before.json
+
+import sys
+import os
+import time
+import json
+import random
+import platform
+import tempfile
+import argparse
+import resource
+import multiprocessing
+
+from changalog import *
+
+# Line of the log timing each phase, as written by ChaNGa
+PHASE_LINES = { 'DomainDecompTimes' : 'Domain decomposition ... took %.6f seconds.\n',
+                'BalancerTimes' : 'Load balancer ... took %.6f seconds.\n',
+                'BuildTreesTimes' : 'Building trees ... took %.6f seconds.\n',
+                'ConsphTimes' : 'Calculating gravity and SPH ... took %.6f seconds.\n',
+                'GravityTimes' : 'Calculating gravity (tree bucket, theta = 0.700000) ... took %.6f seconds.\n',
+                'DensityTimes' : 'Calculating densities/divv on Actives ... took %.6f seconds.\n',
+                'MarkNeighborTimes' : 'Marking Neighbors ... took %.6f seconds.\n',
+                'DensityOfNeighborTimes' : 'Density of Neighbors ... took %.6f seconds.\n',
+                'PressureGradientTimes' : 'Calculating pressure gradients ... took %.6f seconds.\n' }
+
+# Lines without timings that ChaNGa writes around each sub step
+NOISE_LINES = ['Kick Open:\n',
+               'Drift: Rung 0 Delta 0.000125\n',
+               'Kick Close:\n',
+               'Gravity Active: 1021611, Gas Active: 1021610\n',
+               'Rung distribution: (0:101) (1:2040) (2:30517) (3:989453)\n']
+
+# Big steps of the logs benchmarked by default
+DEFAULT_SIZES = [100, 1000, 5000]
+
+# Writes a synthetic ChaNGa log to file object f.
+# Each big step has 2**rungDepth sub steps, each on the rungs active at that
+# time, and each sub step times the phases of the run.
+# Returns the number of lines written.
+# bool consph: write a +consph run, whose gravity and SPH are timed together
+# list phases: axes of the phases timed in each sub step, all phases of the run by default
+# int noise: lines without timings written before each sub step
+def writeSyntheticLog(f, bigSteps, rungDepth=3, consph=False, phases=None, noise=2, seed=0):
+    r = random.Random(seed)
+    if phases is None:
+        if consph:
+            phases = ChangaLog.CONSPH_AXES_LIST
+        else:
+            phases = ChangaLog.AXES_LIST
+        phases = [axis for axis in phases if axis in PHASE_LINES]
+    phaseLines = [PHASE_LINES[axis] for axis in phases]
+    numParticles = 1 << 20
+
+    f.write('ChaNGa version 3.0, synthetic log\n')
+    f.write('Initial Domain decomposition ... took 1.500000 seconds.\n')
+    numLines = 2
+    for step in range(1, bigSteps + 1):
+        numSubSteps = 1 << rungDepth
+        for subStep in range(numSubSteps):
+            # The slowest rung active is the one whose period divides the time
+            fromRung = rungDepth
+            while fromRung > 0 and subStep % (1 << (rungDepth - fromRung + 1)) == 0:
+                fromRung -= 1
+            # Particles on rungs fromRung and up are active, halving with each rung
+            gravityActive = numParticles >> fromRung
+            for i in range(noise):
+                f.write(NOISE_LINES[(step + subStep + i) % len(NOISE_LINES)])
+            f.write('Step: %f Time: %f Rungs %d to %d. Gravity Active: %d, Gas Active: %d\n' %
+                    (step - 1 + float(subStep) / numSubSteps, 0.001 * step, fromRung, rungDepth, gravityActive, gravityActive // 2))
+            for line in phaseLines:
+                f.write(line % (r.random() * gravityActive / numParticles))
+            numLines += noise + 1 + len(phaseLines)
+        f.write('Big step %d took %.6f seconds.\n' % (step, r.random() * 10))
+        numLines += 1
+    f.write('Done.\n')
+    return numLines + 1
+
+# Returns (first, best), the times in seconds of the first and of the
+# fastest of repeats calls of func()
+def timeCall(func, repeats):
+    first = best = None
+    for i in range(repeats):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if first is None:
+            first = elapsed
+        if best is None or elapsed < best:
+            best = elapsed
+    return first, best
+
+# Benchmarks one synthetic log, in a process of its own so that its peak
+# memory is its own. Returns a dict of the results.
+def benchmarkLog(args):
+    bigSteps, options = args
+    f = tempfile.NamedTemporaryFile(suffix='.log', dir=options.tmpdir, delete=False)
+    try:
+        numLines = writeSyntheticLog(f, bigSteps, options.depth, options.consph, options.phases, options.noise)
+        f.close()
+        size = os.path.getsize(f.name)
+        memoryBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Synthetic logs are smaller than PARALLEL_CHUNK_SIZE, so with several
+        # jobs they are split into as many chunks as a large log would be
+        chunksize = PARALLEL_CHUNK_SIZE
+        if options.jobs > 1:
+            chunksize = max(1, size // (4 * options.jobs))
+        start = time.time()
+        logobject = parseChangaLogParallel(f.name, options.jobs, chunksize)
+        parseTime = time.time() - start
+    finally:
+        os.remove(f.name)
+
+    axis = logobject.getAxes()[-1]
+    result = { 'bigSteps' : bigSteps,
+               'subSteps' : len(logobject.rungs),
+               'bytes' : size,
+               'lines' : numLines,
+               'parseSeconds' : parseTime,
+               'parseMBPerSecond' : size / parseTime / (1 << 20),
+               'parseLinesPerSecond' : numLines / parseTime,
+               # ru_maxrss is in kB on Linux. The figures of this process
+               # include the joined log, but not the chunks parsed by other
+               # processes with several jobs: the peak of the largest of
+               # those processes is given apart, 0 with one job.
+               'peakMemoryMB' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+               'parseMemoryMB' : (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoryBefore) / 1024.0,
+               'workerMemoryMB' : resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0,
+               'axis' : axis }
+    for name, func in [('getDataBigStep', lambda: logobject.getData(axis, 'Big step')),
+                       ('getDataSubStep', lambda: logobject.getData(axis, 'Sub step')),
+                       ('getRungs', lambda: logobject.getRungs(axis)),
+                       ('getSummedRungs', lambda: logobject.getSummedRungs(axis))]:
+        # Drop everything derived by the previous accessors, the rungs of the
+        # events included, as if the log had just been parsed
+        logobject.clearDerived()
+        result[name + 'FirstSeconds'], result[name + 'Seconds'] = timeCall(func, options.repeats)
+    return result
+
+# Runs benchmarkLog in a process and sends back (result, None), or
+# (None, exception) if it failed
+# Connection connection: end of a pipe to the parent process
+def benchmarkLogProcess(connection, args):
+    try:
+        connection.send((benchmarkLog(args), None))
+    except Exception, e:
+        connection.send((None, e))
+    finally:
+        connection.close()
+
+# Returns the benchmark results of every size, as a dict with the settings
+def runBenchmarks(options):
+    results = []
+    for bigSteps in options.sizes:
+        # One process per log, which exits once done. Not a Pool worker, which
+        # could not start the processes parsing the log with several jobs.
+        receiver, sender = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(target=benchmarkLogProcess, args=(sender, (bigSteps, options)))
+        process.start()
+        sender.close()
+        try:
+            result, error = receiver.recv()
+        finally:
+            receiver.close()
+            process.join()
+        if error is not None:
+            raise error
+        results.append(result)
+        printResult(result)
+    return { 'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+             'python' : platform.python_version(),
+             'machine' : platform.node(),
+             'settings' : { 'depth' : options.depth, 'consph' : options.consph, 'phases' : options.phases,
+                            'noise' : options.noise, 'jobs' : options.jobs, 'repeats' : options.repeats },
+             'results' : results }
+
+# Prints the results of one log
+def printResult(result, out=None):
+    if out is None:
+        out = sys.stdout
+    print >>out, "%(bigSteps)d big steps, %(subSteps)d sub steps, %(lines)d lines:" % result
+    print >>out, "  parse:           %(parseSeconds).3f s  %(parseMBPerSecond).1f MB/s  %(parseLinesPerSecond).0f lines/s" % result
+    print >>out, "  memory:          %(peakMemoryMB).1f MB peak, %(parseMemoryMB).1f MB for the parse" % result
+    # Runs saved before the parse processes were measured lack them
+    if result.get('workerMemoryMB', 0) > 0:
+        print >>out, "                   %(workerMemoryMB).1f MB peak of the largest parse process" % result
+    for name, title in [('getDataBigStep', 'getData Big step:'), ('getDataSubStep', 'getData Sub step:'),
+                        ('getRungs', 'getRungs:'), ('getSummedRungs', 'getSummedRungs:')]:
+        print >>out, "  %-18s %.2f ms first call, %.2f ms after" % (title, 1000 * result[name + 'FirstSeconds'], 1000 * result[name + 'Seconds'])
+
+# Prints how each result compares with the result of the same size in an
+# earlier run. Times are ratios new/old, so above 1 is slower.
+def printComparison(old, new, out=None):
+    if out is None:
+        out = sys.stdout
+    oldResults = dict([(result['bigSteps'], result) for result in old['results']])
+    names = ['parseSeconds', 'peakMemoryMB', 'workerMemoryMB']
+    for name in ['getDataBigStep', 'getDataSubStep', 'getRungs', 'getSummedRungs']:
+        names += [name + 'FirstSeconds', name + 'Seconds']
+    print >>out, "Compared with the run of %s (new/old):" % old['date']
+    # Logs written with other settings take other times
+    for name in sorted(set(old['settings']) | set(new['settings'])):
+        if old['settings'].get(name) != new['settings'].get(name):
+            print >>out, "  Warning: %s was %s, now %s" % (name, old['settings'].get(name), new['settings'].get(name))
+    for result in new['results']:
+        oldResult = oldResults.get(result['bigSteps'])
+        if oldResult is None:
+            continue
+        print >>out, "%d big steps:" % result['bigSteps']
+        for name in names:
+            # Runs saved before first calls were timed lack them
+            if oldResult.get(name, 0) > 0:
+                print >>out, "  %-27s %.2f" % (name + ':', result[name] / oldResult[name])
+
+# Returns the parsed command line options
+# list args: command line arguments, without the program name
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description='Benchmark the ChaNGa log parser on synthetic logs.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='STEPS',
+                        help='big steps of the logs benchmarked (default: %(default)s)')
+    parser.add_argument('-d', '--depth', type=int, default=3,
+                        help='rung depth, each big step having 2**DEPTH sub steps (default: %(default)s)')
+    parser.add_argument('--consph', action='store_true',
+                        help='write +consph logs')
+    parser.add_argument('--phases', type=lambda value: value.split(','), metavar='AXIS,...',
+                        help='phases timed in each sub step (default: all those of the run)')
+    parser.add_argument('--noise', type=int, default=2,
+                        help='lines without timings before each sub step (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='processes parsing each log, in four chunks per process (default: %(default)s)')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='calls of each accessor, of which the fastest counts (default: %(default)s)')
+    parser.add_argument('--tmpdir',
+                        help='directory of the synthetic logs (default: the system temporary directory)')
+    parser.add_argument('-o', '--output',
+                        help='save the results to this JSON file')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='compare the results with those saved by an earlier run')
+    options = parser.parse_args(args)
+    for axis in options.phases or []:
+        if axis not in PHASE_LINES:
+            parser.error('unknown phase %s, choose from %s' % (axis, ', '.join(sorted(PHASE_LINES))))
+    return options
+
+#### MAIN ####
+
+def main(*args):
+    options = parseArgs(list(args[1:]))
+    run = runBenchmarks(options)
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            json.dump(run, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+    if options.compare:
+        f = open(options.compare)
+        try:
+            old = json.load(f)
+        finally:
+            f.close()
+        printComparison(old, run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv))
@@ -0,0 +1,313 @@
+#!/usr/bin/python
+# oldtimer_cli.py
+# Analyzes ChaNGa logs from the command line, without a display: prints or
+# saves the statistics of each log, and writes plots to image files.
+# Imports neither PySide nor pylab, so it starts quickly on cluster login nodes.
+#
+# ex:  oldtimer_cli.py --totals -p GravityTimes -p TotalStepTime -o stats/ run*/changa.log
+#      oldtimer_cli.py --compare -t -p GravityTimes cores64.log cores128.log cores256.log
+#      oldtimer_cli.py --follow -t running/changa.log
+
+import sys
+import os
+import time
+import argparse
+
+from changalog import *
+from oldtimer_compare import *
+from oldtimer_export import *
+from oldtimer_analysis import *
+from oldtimer_anomaly import *
+from oldtimer_hotspots import *
+
+# Seconds between rereads of followed logs, as in the GUI
+FOLLOW_INTERVAL = 2.0
+
+# Returns the parsed command line options
+# list args: command line arguments, without the program name
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description='Analyze ChaNGa logs without a display.')
+    parser.add_argument('logs', nargs='+', metavar='LOG',
+                        help='ChaNGa log files')
+    parser.add_argument('-t', '--totals', action='store_true',
+                        help='only print the stats totals, not those of every big step')
+    parser.add_argument('-o', '--output-dir', dest='outdir',
+                        help='write the stats of each log to OUTDIR/LOG.stats.txt, and plots to OUTDIR, '
+                             'instead of stats to stdout and plots to the current directory; logs with the same '
+                             'file name are named by their path, with / replaced by _')
+    parser.add_argument('-p', '--plot', action='append', default=[], metavar='AXIS',
+                        help='plot an axis of each log, e.g. GravityTimes; can be repeated. '
+                             'Axes: ' + ', '.join(sorted(set(ChangaLog.AXES_LIST + ChangaLog.CONSPH_AXES_LIST))))
+    parser.add_argument('-r', '--resolution', default=ChangaLog.RESOLUTION_LIST[0], choices=ChangaLog.RESOLUTION_LIST,
+                        help='resolution of the plots (default: %(default)s)')
+    parser.add_argument('--step', action='store_true',
+                        help='draw steps instead of points joined by lines')
+    parser.add_argument('--annotate', action='store_true',
+                        help='annotate sub step points with their active particles')
+    parser.add_argument('--format', default='png',
+                        help='image format of the plots (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='number of logs parsed in parallel (default: one per core)')
+    parser.add_argument('--no-cache', dest='usecache', action='store_false',
+                        help='always reparse, and do not write parse caches')
+    parser.add_argument('-s', '--scaling', action='store_true',
+                        help='also fit the time of each phase against the active particles of the sub steps, '
+                             'over all sub steps and by rung, and list the sub steps far from their fit')
+    parser.add_argument('--hotspots', type=int, metavar='N',
+                        help='print where the time goes instead of the stats of every big step: the share of '
+                             'each phase and rung, and the N slowest big steps, sub steps and phase events, '
+                             'e.g. --hotspots %d' % HOT_SPOTS)
+    parser.add_argument('-a', '--anomalies', action='store_true',
+                        help='also list the big steps whose time in a phase is far above the median of the '
+                             'big steps before them, in median absolute deviations')
+    parser.add_argument('-w', '--window', type=int, default=ANOMALY_WINDOW,
+                        help='big steps before each one it is compared with, for anomalies (default: %(default)s)')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        help='keep reading the logs as the simulations write them, and print the anomalies '
+                             'of each new big step on stdout, until interrupted')
+    parser.add_argument('-e', '--export', choices=EXPORT_FORMATS,
+                        help='also export the step, sub step and rung timings of each log to columnar files '
+                             'in OUTDIR, for dashboards (parquet and feather need pyarrow, hdf5 needs h5py)')
+    parser.add_argument('-c', '--compare', action='store_true',
+                        help='also compare the logs with the first one, aligned by big step, or by rung with '
+                             '-r "Summed rungs": print the speedups of every axis, and plot those of the -p axes')
+    options = parser.parse_args(args)
+    if options.window < 1:
+        parser.error('the anomaly window needs at least one big step')
+    if options.compare and options.resolution not in COMPARE_RESOLUTION_LIST:
+        parser.error('logs can only be compared by %s, not by %s' % (' or '.join(COMPARE_RESOLUTION_LIST), options.resolution))
+    return options
+
+# Returns the names of logs: their file names, unless several logs have the
+# same file name, as run*/changa.log do, then their paths
+def getLogNames(filenames):
+    names = [os.path.basename(filename) for filename in filenames]
+    if len(set(names)) < len(names):
+        names = list(filenames)
+    return names
+
+# Returns the name of a log turned into a file name, for the files written
+# for it in the output directory
+def getOutputName(logname):
+    return os.path.normpath(logname).lstrip(os.sep).replace(os.sep, '_')
+
+# Writes a plot of one axis of a log to an image file.
+# Returns False, writing nothing, if the log has no points to plot.
+def savePlot(filename, logobject, logname, axis, resolution, dostep, doannotate):
+    # Imported here, so runs without plots never load matplotlib.
+    # Drawing straight onto an Agg canvas needs no display and no pyplot.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from oldtimer_plot import drawPlot, drawBarPlot
+
+    if resolution == 'Summed rungs':
+        points = logobject.getSummedRungs(axis)
+    else:
+        points = logobject.getData(axis, resolution)
+    if len(points['yData']) == 0:
+        return False
+
+    fig = Figure(figsize=(12, 6))
+    canvas = FigureCanvasAgg(fig)
+    axes = fig.add_subplot(111)
+    # Room for the rotated tick labels
+    fig.subplots_adjust(bottom=0.2)
+    if resolution == 'Summed rungs':
+        drawBarPlot(axes, 0, points['yData'], points['xData'], logname + '.' + axis, resolution)
+    else:
+        drawPlot(axes, points['yData'], points['xData'], points['xLabels'], points['annotations'], logname + '.' + axis, resolution, dostep, doannotate)
+    canvas.print_figure(filename)
+    return True
+
+# Writes a plot of the speedups of one axis in every compared log to an image file
+def saveComparisonPlot(filename, comparison, axis, dostep):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from oldtimer_plot import drawPlot, drawBarPlot
+
+    fig = Figure(figsize=(12, 6))
+    canvas = FigureCanvasAgg(fig)
+    axes = fig.add_subplot(111)
+    fig.subplots_adjust(bottom=0.2)
+    for numPlots, name in enumerate(comparison.names):
+        points = comparison.getPoints(name, axis, 'speedups')
+        label = name + '.' + axis
+        if comparison.resolution == 'Summed rungs':
+            drawBarPlot(axes, numPlots, points['yData'], points['xData'], label, comparison.resolution)
+        else:
+            drawPlot(axes, points['yData'], points['xData'], points['xLabels'], points['annotations'], label, comparison.resolution, dostep, False)
+    axes.set_ylabel(QUANTITY_LABELS['speedups'])
+    canvas.print_figure(filename)
+
+# Prints the stats of a log and writes its plots, as asked by options.
+# Returns (detector, ok): the AnomalyDetector of the log with --anomalies, or
+# None, and whether every plot could be written.
+# str logname: name of the log in plots and output files, see getLogNames
+def analyzeLog(logobject, filename, logname, options):
+    detector = None
+    ok = True
+    outname = getOutputName(logname)
+    outdir = options.outdir or '.'
+
+    if logobject.malformedLines:
+        print >>sys.stderr, "%s: skipped %d malformed rung lines, first at line %d" % (filename, len(logobject.malformedLines), logobject.malformedLines[0] + 1)
+
+    if options.outdir:
+        out = open(os.path.join(outdir, outname + '.stats.txt'), 'w')
+    else:
+        out = sys.stdout
+    try:
+        print >>out, filename, ':'
+        print >>out, "Is consph?:", logobject.isconsph
+        logobject.printStats(out, steps=not (options.totals or options.hotspots))
+        print >>out
+        if options.hotspots:
+            printHotSpots(logobject, options.hotspots, out)
+            print >>out
+        if options.scaling:
+            scaling = fitActiveScaling(logobject)
+            printActiveScaling(scaling, out)
+            printActiveScaling(fitActiveScaling(logobject, byRung=True), out)
+            printOutliers(logobject, scaling, out=out)
+            print >>out
+        if options.anomalies:
+            detector = AnomalyDetector(logobject.getAxes(), options.window)
+            printAnomalies(detector.update(logobject), detector, out)
+            print >>out
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    for axis in options.plot:
+        if axis not in logobject.getAxes():
+            print >>sys.stderr, "%s: no axis %s" % (filename, axis)
+            continue
+        if axis == 'TotalStepTime' and options.resolution != 'Big step':
+            print >>sys.stderr, "%s: %s only has a Big step resolution" % (filename, axis)
+            continue
+        plotname = '%s.%s.%s.%s' % (outname, axis, options.resolution.replace(' ', '_'), options.format)
+        # A plot that cannot be drawn or written is reported, and the other
+        # plots and logs are still done
+        try:
+            if not savePlot(os.path.join(outdir, plotname), logobject, logname, axis, options.resolution, options.step, options.annotate):
+                print >>sys.stderr, "%s: nothing to plot for %s by %s" % (filename, axis, options.resolution)
+        except Exception, e:
+            print >>sys.stderr, "%s: cannot plot %s: %s" % (filename, axis, e)
+            ok = False
+
+    if options.export:
+        exportLog(logobject, os.path.join(outdir, outname), options.export, logname)
+    return detector, ok
+
+# Prints the comparison of the logs and writes the plots of their speedups,
+# as asked by options
+# list filenames, logobjects: the logs opened
+def compareAll(filenames, logobjects, options):
+    outdir = options.outdir or '.'
+    names = getLogNames(filenames)
+    resolution = options.resolution
+    comparison = compareLogs(names, logobjects, resolution=resolution)
+
+    if options.outdir:
+        out = open(os.path.join(outdir, 'compare.stats.txt'), 'w')
+    else:
+        out = sys.stdout
+    try:
+        printComparison(comparison, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    for axis in options.plot:
+        if axis not in comparison.axes:
+            print >>sys.stderr, "Not every log has axis %s by %s" % (axis, resolution)
+            continue
+        plotname = 'compare.%s.%s.%s' % (axis, resolution.replace(' ', '_'), options.format)
+        saveComparisonPlot(os.path.join(outdir, plotname), comparison, axis, options.step)
+
+# Reads what is appended to the logs every FOLLOW_INTERVAL seconds, and
+# prints the anomalies of their new big steps, until interrupted
+# list filenames, logobjects: the logs opened
+# dict detectors: AnomalyDetector of the logs by file name, if already made
+def followLogs(filenames, logobjects, detectors, options):
+    def getDetector(filename, logobject):
+        # Made once the log has big steps, and so the axes of its run
+        if detectors.get(filename) is None and logobject.getNumBigSteps():
+            detectors[filename] = AnomalyDetector(logobject.getAxes(), options.window)
+        return detectors.get(filename)
+
+    for filename, logobject in zip(filenames, logobjects):
+        # The big steps already written fill the window
+        detector = getDetector(filename, logobject)
+        if detector is not None:
+            detector.update(logobject)
+    print >>sys.stderr, "Following %d logs, interrupt to stop" % len(filenames)
+    try:
+        while True:
+            time.sleep(FOLLOW_INTERVAL)
+            for filename, logobject in zip(filenames, logobjects):
+                try:
+                    f = open(filename, 'rb')
+                except IOError:
+                    continue
+                try:
+                    newSteps = logobject.updateFromFile(f)
+                finally:
+                    f.close()
+                if newSteps:
+                    for anomaly in getDetector(filename, logobject).update(logobject):
+                        print "%s: %s" % (filename, formatAnomaly(anomaly))
+                    sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+#### MAIN ####
+
+def main(*args):
+    options = parseArgs(list(args[1:]))
+    if options.outdir and not os.path.isdir(options.outdir):
+        os.makedirs(options.outdir)
+    # Fail before parsing if the export format cannot be written
+    if options.export:
+        try:
+            getExportModules(options.export)
+        except ImportError, e:
+            print >>sys.stderr, e
+            return 1
+
+    # Report progress on stderr, keeping stdout for the stats
+    def progress(done, total, filename, error):
+        if error is not None:
+            print >>sys.stderr, "Cannot open %s: %s" % (filename, error)
+        else:
+            print >>sys.stderr, "[%d/%d] Parsed %s" % (done, total, filename)
+
+    # Followed logs may be mid-line
+    logobjects = openChangaLogs(options.logs, options.usecache, options.jobs, progress, final=not options.follow)
+
+    status = 0
+    detectors = {}
+    for filename, logname, logobject in zip(options.logs, getLogNames(options.logs), logobjects):
+        if logobject is None:
+            status = 1
+        else:
+            detectors[filename], ok = analyzeLog(logobject, filename, logname, options)
+            if not ok:
+                status = 1
+
+    if options.compare:
+        opened = [(filename, logobject) for filename, logobject in zip(options.logs, logobjects) if logobject is not None]
+        if len(opened) < 2:
+            print >>sys.stderr, "Need two logs or more to compare"
+            status = 1
+        else:
+            compareAll([filename for filename, logobject in opened], [logobject for filename, logobject in opened], options)
+
+    if options.follow:
+        opened = [(filename, logobject) for filename, logobject in zip(options.logs, logobjects) if logobject is not None]
+        followLogs([filename for filename, logobject in opened], [logobject for filename, logobject in opened], detectors, options)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv))
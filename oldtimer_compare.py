@@ -0,0 +1,221 @@
+# oldtimer_compare.py
+# Compares many ChaNGa logs at once, such as the same problem run on 64, 128
+# and 256 cores: aligns the phase times of the logs by big step or by rung,
+# and computes the ratios, speedups and differences of every run against one
+# of them, for all phases in one go.
+# Needs only NumPy, like changalog.py.
+
+import sys
+
+import numpy as np
+
+from changalog import *
+
+# Open logs indexed by name, in the order they were added
+class LogStore():
+    def __init__(self):
+        self.names = []
+        self.logs = {}
+
+    # Adds a log under a name that no other log has
+    def add(self, name, log):
+        if name in self.logs:
+            raise ValueError('a log is already named %s' % name)
+        self.names.append(name)
+        self.logs[name] = log
+
+    def remove(self, name):
+        del self.logs[name]
+        self.names.remove(name)
+
+    # Returns the log of a name, or default if there is none
+    def get(self, name, default=None):
+        return self.logs.get(name, default)
+
+    def __getitem__(self, name):
+        return self.logs[name]
+
+    def __contains__(self, name):
+        return name in self.logs
+
+    def __len__(self):
+        return len(self.names)
+
+    # Iterates over the logs in the order they were added
+    def __iter__(self):
+        return (self.logs[name] for name in self.names)
+
+
+# Resolutions logs can be aligned by: big step number, or big step and rung
+COMPARE_RESOLUTION_LIST = ['Big step', 'Summed rungs']
+# Quantities of LogComparison.getPoints, and their y axis labels
+QUANTITY_LABELS = { 'times' : 'time (s)',
+                    'ratios' : 'time ratio',
+                    'speedups' : 'speedup',
+                    'differences' : 'time difference (s)' }
+# Bits of the rung in the keys of summed rungs, (step << RUNG_BITS) + rung
+RUNG_BITS = 8
+
+# Phase times of several logs aligned on the same columns: big steps, or the
+# rungs of each big step. Computed by compareLogs.
+class LogComparison():
+    # list names: names of the logs
+    # list axes: axes compared
+    # string resolution: one of COMPARE_RESOLUTION_LIST
+    # array keys: big step of each column, or (step << RUNG_BITS) + rung
+    # array times: times of each axis, log and column, NaN where a log lacks the column
+    # int base: index of the log the others are compared with
+    def __init__(self, names, axes, resolution, keys, times, base=0):
+        self.names = names
+        self.axes = axes
+        self.resolution = resolution
+        self.keys = keys
+        self.times = times
+        self.base = base
+        self.times.flags.writeable = False
+        # Columns of every log, the only ones counted in totals
+        self.complete = ~np.isnan(times).any(axis=1).any(axis=0)
+
+    # Makes the ratios, speedups and differences relative to a log
+    def setBase(self, name):
+        self.base = self.names.index(name)
+
+    def getBaseTimes(self):
+        return self.times[:, self.base:self.base + 1, :]
+
+    # Returns the times of every axis, log and column divided by those of the base log
+    def getRatios(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.times / self.getBaseTimes()
+
+    # Returns the times of the base log divided by those of every axis, log and column
+    def getSpeedups(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.getBaseTimes() / self.times
+
+    # Returns the times of every axis, log and column minus those of the base log
+    def getDifferences(self):
+        return self.times - self.getBaseTimes()
+
+    # Returns the total time of each axis and log over the columns of every log
+    def getTotals(self):
+        return self.times[:, :, self.complete].sum(axis=2)
+
+    # Returns the speedup of each axis and log on the totals
+    def getTotalSpeedups(self):
+        totals = self.getTotals()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return totals[:, self.base:self.base + 1] / totals
+
+    # Returns the labels of the columns
+    def getLabels(self):
+        if self.resolution == 'Big step':
+            return ['Step ' + str(step) for step in self.keys.tolist()]
+        labels = []
+        for key in self.keys.tolist():
+            step = key >> RUNG_BITS
+            rung = key & ((1 << RUNG_BITS) - 1)
+            # If Rung 0 then label step number, as ChangaLog.getSummedRungs
+            if rung == 0:
+                labels.append('Step ' + str(step) + ', Rung ' + str(rung))
+            else:
+                labels.append('Rung ' + str(rung))
+        return labels
+
+    # Returns the points of one log and axis, in the form returned by
+    # ChangaLog.getData for 'Big step' and by ChangaLog.getSummedRungs for
+    # 'Summed rungs', so that they are plotted the same way.
+    # string quantity: one of QUANTITY_LABELS
+    def getPoints(self, name, axis, quantity):
+        if quantity == 'times':
+            values = self.times
+        elif quantity == 'ratios':
+            values = self.getRatios()
+        elif quantity == 'speedups':
+            values = self.getSpeedups()
+        elif quantity == 'differences':
+            values = self.getDifferences()
+        else:
+            raise ValueError('unknown quantity %s' % quantity)
+        yData = values[self.axes.index(axis), self.names.index(name)]
+        # Columns the log lacks, or where a time is 0 for a ratio, have no value
+        isFinite = np.isfinite(yData)
+        if self.resolution == 'Summed rungs':
+            # Bars stay aligned on the labels of every log
+            return {'yData': np.where(isFinite, yData, 0.0).tolist(), 'xData': self.getLabels()}
+        return {'yData': yData[isFinite], 'xData': self.keys[isFinite], 'xLabels': [], 'annotations': []}
+
+
+# Returns the axes of every log, in the order of the first, that can be
+# compared by resolution
+def getCommonAxes(logobjects, resolution):
+    axes = []
+    for axis in logobjects[0].getAxes():
+        # Times of whole big steps are not split by rung
+        if axis == 'TotalStepTime' and resolution != 'Big step':
+            continue
+        if all(axis in logobject.getAxes() for logobject in logobjects):
+            axes.append(axis)
+    return axes
+
+# Returns for each log the key of the column of each of its rows: its big
+# steps by 'Big step', its rung sub steps by 'Summed rungs'
+def getColumnKeys(logobjects, resolution):
+    if resolution == 'Big step':
+        return [logobject.stepNumber.astype(np.int64) for logobject in logobjects]
+    elif resolution == 'Summed rungs':
+        return [(logobject.rungs['step'].astype(np.int64) << RUNG_BITS) + logobject.rungs['fromRung']
+                for logobject in logobjects]
+    raise ValueError('cannot compare logs by %s, only by %s' % (resolution, ', '.join(COMPARE_RESOLUTION_LIST)))
+
+# Returns a LogComparison of logs, aligning their times by resolution, with
+# NaN times for the columns a log lacks, e.g. the last big steps of a run that
+# stopped earlier than the others.
+# list names, logobjects: names and ChangaLogs of the logs
+# list axes: axes compared, all those of every log by default
+# string resolution: one of COMPARE_RESOLUTION_LIST
+# string base: name of the log the others are compared with, the first by default
+def compareLogs(names, logobjects, axes=None, resolution='Big step', base=None):
+    if not logobjects:
+        raise ValueError('no logs to compare')
+    logKeys = getColumnKeys(logobjects, resolution)
+    if axes is None:
+        axes = getCommonAxes(logobjects, resolution)
+    keys = np.unique(np.concatenate(logKeys))
+
+    times = np.empty((len(axes), len(logobjects), len(keys)))
+    for log, (logobject, rowKeys) in enumerate(zip(logobjects, logKeys)):
+        columns = np.searchsorted(keys, rowKeys)
+        hasColumn = np.bincount(columns, minlength=len(keys)) > 0
+        for index, axis in enumerate(axes):
+            if resolution == 'Big step':
+                rowTimes = logobject.getData(axis, resolution)['yData']
+            else:
+                rowTimes = logobject.getRungTimes(axis)
+            times[index, log] = np.bincount(columns, weights=rowTimes, minlength=len(keys))
+        times[:, log, ~hasColumn] = np.nan
+
+    comparison = LogComparison(list(names), list(axes), resolution, keys, times)
+    if base is not None:
+        comparison.setBase(base)
+    return comparison
+
+# Prints the total time of every axis and log, and their speedups and
+# differences against the base log
+# file object out: where to print them, stdout by default
+def printComparison(comparison, out=None):
+    if out is None:
+        out = sys.stdout
+    totals = comparison.getTotals()
+    speedups = comparison.getTotalSpeedups()
+    differences = totals - totals[:, comparison.base:comparison.base + 1]
+    columns = "".join(["%14s" % name[-13:] for name in comparison.names])
+
+    print >>out, "Compared with %s over %d %s of every log:" % (comparison.names[comparison.base], np.count_nonzero(comparison.complete),
+                                                              'big steps' if comparison.resolution == 'Big step' else 'summed rungs')
+    print >>out, "%-32s" % "", columns
+    for index, axis in enumerate(comparison.axes):
+        title = getAxisTitle(axis)
+        print >>out, "%-32s" % ("Total " + title + " times:"), "".join(["%14.4f" % total for total in totals[index].tolist()])
+        print >>out, "%-32s" % ("  speedup:"), "".join(["%14.3f" % speedup for speedup in speedups[index].tolist()])
+        print >>out, "%-32s" % ("  difference:"), "".join(["%14.4f" % difference for difference in differences[index].tolist()])
@@ -0,0 +1,155 @@
+# oldtimer_export.py
+# Exports the timings parsed from ChaNGa logs to columnar files, so that
+# dashboards can query many runs without parsing their logs again:
+# Parquet or Feather files with pyarrow, or HDF5 files with h5py. Only the
+# module of the format written is needed.
+# Columns are written straight from the NumPy arrays of a ChangaLog, in
+# chunks of rows, without going through Python lists.
+#
+# Each log is exported as three tables, with a column of times for each
+# phase axis of the log:
+#   steps:     one row per big step
+#   substeps:  one row per rung sub step
+#   rungs:     one row per rung of each big step, its sub steps summed
+
+import collections
+
+import numpy as np
+
+# Formats of exportLog
+EXPORT_FORMATS = ['parquet', 'feather', 'hdf5']
+# Extension of the files of each format
+EXPORT_EXTENSIONS = { 'parquet' : '.parquet',
+                      'feather' : '.feather',
+                      'hdf5' : '.h5' }
+# Rows written at a time: a Parquet row group, an Arrow record batch, or an
+# HDF5 chunk
+EXPORT_CHUNK_ROWS = 1 << 16
+
+# Returns the modules writing a format, raising ImportError with the module to
+# install if it is missing
+def getExportModules(format):
+    if format not in EXPORT_FORMATS:
+        raise ValueError('unknown export format %s, choose from %s' % (format, ', '.join(EXPORT_FORMATS)))
+    try:
+        if format == 'hdf5':
+            import h5py
+            return h5py,
+        import pyarrow
+        if format == 'parquet':
+            import pyarrow.parquet
+            return pyarrow, pyarrow.parquet
+        return pyarrow,
+    except ImportError:
+        raise ImportError('exporting to %s needs %s' % (format, 'h5py' if format == 'hdf5' else 'pyarrow'))
+
+# Returns the tables of a log, as an OrderedDict by table name of
+# OrderedDicts of arrays by column name
+def getExportTables(logobject):
+    axes = [axis for axis in logobject.getAxes() if axis != 'TotalStepTime']
+    rungs = logobject.rungs
+
+    steps = collections.OrderedDict()
+    steps['step'] = logobject.stepNumber
+    steps['stepTime'] = logobject.stepTime
+    steps['firstLine'] = logobject.stepFirstLine
+    steps['numLines'] = logobject.stepNumLines
+    for axis in axes:
+        steps[axis] = logobject.getAllStepsKeywordTimes(axis)
+
+    substeps = collections.OrderedDict()
+    for name in ['step', 'fromRung', 'toRung', 'gravityActive', 'gasActive']:
+        substeps[name] = rungs[name]
+    substeps['firstLine'] = logobject.getLogLineNumbers(rungs['step'], rungs['fromIndex'])
+    for axis in axes:
+        substeps[axis] = logobject.getRungTimes(axis)
+
+    # Summed rungs are groups of consecutive rows of the rungs sorted by step and rung
+    order, group, labels = logobject.getSummedRungGroups()
+    firstRows = order[np.searchsorted(group, np.arange(len(labels)))]
+    summed = collections.OrderedDict()
+    summed['step'] = rungs['step'][firstRows]
+    summed['rung'] = rungs['fromRung'][firstRows]
+    summed['numSubSteps'] = np.bincount(group, minlength=len(labels))
+    for axis in axes:
+        summed[axis] = logobject.getSummedRungTimes(axis)
+
+    return collections.OrderedDict([('steps', steps), ('substeps', substeps), ('rungs', summed)])
+
+# Returns the metadata stored with the tables of a log, as strings
+def getExportMetadata(logobject, logname):
+    return collections.OrderedDict([('log', logname),
+                                    ('isconsph', str(int(logobject.isconsph))),
+                                    ('phases', ','.join([axis for axis in logobject.getAxes() if axis != 'TotalStepTime']))])
+
+# Returns the first row of each chunk of a table of numRows rows; a table
+# without rows still has one, empty, chunk
+def getChunkStarts(numRows, chunkRows):
+    return range(0, numRows, chunkRows) or [0]
+
+# Writes one table to a Parquet or Feather file.
+# Feather files are Arrow IPC files, read by pyarrow.feather.read_table
+# (pyarrow.ipc.open_file before pyarrow 0.17).
+def writeArrowTable(filename, columns, metadata, format, chunkRows):
+    modules = getExportModules(format)
+    pa = modules[0]
+    schema = pa.schema([pa.field(name, pa.from_numpy_dtype(values.dtype)) for name, values in columns.items()],
+                       metadata=metadata)
+    if format == 'parquet':
+        writer = modules[1].ParquetWriter(filename, schema)
+        writeBatch = lambda batch: writer.write_table(pa.Table.from_batches([batch], schema))
+    else:
+        writer = pa.RecordBatchFileWriter(filename, schema)
+        writeBatch = writer.write_batch
+    try:
+        numRows = len(columns.values()[0])
+        for start in getChunkStarts(numRows, chunkRows):
+            # Fields of the rungs are strided views, copied a chunk at a time
+            arrays = [pa.array(np.ascontiguousarray(values[start:start + chunkRows])) for values in columns.values()]
+            writeBatch(pa.RecordBatch.from_arrays(arrays, schema.names))
+    finally:
+        writer.close()
+
+# Writes all tables to one HDF5 file, a group per table and a chunked,
+# compressed dataset per column
+def writeHdf5Tables(filename, tables, metadata, chunkRows):
+    h5py, = getExportModules('hdf5')
+    f = h5py.File(filename, 'w')
+    try:
+        for name, value in metadata.items():
+            f.attrs[name] = value
+        for tableName, columns in tables.items():
+            # Columns are listed in table order, not by name
+            group = f.create_group(tableName, track_order=True)
+            for name, values in columns.items():
+                dataset = group.create_dataset(name, shape=values.shape, maxshape=(None,), dtype=values.dtype,
+                                               chunks=(chunkRows,), compression='gzip', shuffle=True)
+                for start in range(0, len(values), chunkRows):
+                    dataset[start:start + chunkRows] = values[start:start + chunkRows]
+    finally:
+        f.close()
+
+# Exports the tables of a log to files named after basename, and returns
+# their names: basename.TABLE.parquet or .feather, one file per table, or
+# basename.h5 with all tables
+# string format: one of EXPORT_FORMATS
+# string logname: name of the log stored with the tables, basename by default
+def exportLog(logobject, basename, format, logname=None, chunkRows=EXPORT_CHUNK_ROWS):
+    getExportModules(format)
+    if logname is None:
+        logname = basename
+    tables = getExportTables(logobject)
+    metadata = getExportMetadata(logobject, logname)
+    if format == 'hdf5':
+        filename = basename + EXPORT_EXTENSIONS[format]
+        writeHdf5Tables(filename, tables, metadata, chunkRows)
+        return [filename]
+
+    filenames = []
+    for tableName, columns in tables.items():
+        filename = basename + '.' + tableName + EXPORT_EXTENSIONS[format]
+        tableMetadata = collections.OrderedDict(metadata)
+        tableMetadata['table'] = tableName
+        writeArrowTable(filename, columns, tableMetadata, format, chunkRows)
+        filenames.append(filename)
+    return filenames
@@ -0,0 +1,99 @@
+# oldtimer_hotspots.py
+# Reports where the time of a ChaNGa log goes, for runs too long to read the
+# stats of every big step: the share of each phase and rung in the big step
+# times, and the slowest big steps, sub steps and phase events. The slowest
+# are found with a partial sort, so the report takes seconds on the largest
+# logs.
+# Needs only NumPy, like changalog.py.
+
+import sys
+
+import numpy as np
+
+from changalog import *
+
+# Most entries of each list of the hot spot report
+HOT_SPOTS = 10
+
+# Returns the indexes of the n largest values, largest first. Only those n
+# are sorted, after argpartition has found them.
+def getTopIndexes(values, n):
+    if n < len(values):
+        top = np.argpartition(values, len(values) - n)[len(values) - n:]
+    else:
+        top = np.arange(len(values))
+    return top[np.argsort(-values[top], kind='mergesort')]
+
+# Prints where the time of a log goes, instead of the stats of every big
+# step: the share of each phase and rung in the big step times, and the n
+# slowest big steps, sub steps and phase events, with their slowest phase.
+# Every list comes from one pass over the columns of the log.
+# int n: most entries of each list
+# file object out: where to print it, stdout by default
+def printHotSpots(logobject, n=HOT_SPOTS, out=None):
+    if out is None:
+        out = sys.stdout
+    phases = [logobject.getPhaseId(axis) for axis in logobject.getAxes() if axis != 'TotalStepTime']
+    titles = dict([(logobject.getPhaseId(axis), getAxisTitle(axis)) for axis in logobject.getAxes() if axis != 'TotalStepTime'])
+    numBigSteps = logobject.getNumBigSteps()
+    wallTime = float(logobject.getAllStepsTimes().sum())
+    def share(time):
+        if wallTime > 0:
+            return "%5.1f%%" % (100 * time / wallTime)
+        return "     -"
+
+    # Only the events of the phases of the run: consph runs also match
+    # 'Calculating gravity' in their 'Calculating gravity and SPH' lines
+    isRunPhase = np.zeros(len(ChangaLog.PHASES), bool)
+    isRunPhase[phases] = True
+    events = np.flatnonzero(isRunPhase[logobject.eventPhase])
+    eventTimes = logobject.eventTime[events]
+    eventPhases = logobject.eventPhase[events].astype(np.int64)
+    eventRungs = logobject.getEventRungs()[events]
+
+    print >>out, "Hot spots, out of %g s of big steps:" % wallTime
+    print >>out, "Phases:"
+    # Time of each phase in each big step, summed without the sort of the
+    # percentiles of getStepStats
+    stepTimes = np.bincount(eventPhases * numBigSteps + logobject.eventStep[events] - 1, weights=eventTimes,
+                            minlength=len(ChangaLog.PHASES) * numBigSteps).reshape(len(ChangaLog.PHASES), numBigSteps)
+    phaseTimes = stepTimes.sum(axis=1)
+    for phase in sorted(phases, key=lambda phase: -phaseTimes[phase]):
+        print >>out, "  %-28s %14.4f s %s" % (titles[phase] + ":", phaseTimes[phase], share(phaseTimes[phase]))
+
+    print >>out, "Rungs:"
+    subStepTimes = np.bincount(eventRungs[eventRungs >= 0], weights=eventTimes[eventRungs >= 0], minlength=len(logobject.rungs))
+    fromRungs = logobject.rungs['fromRung']
+    rungTimes = np.bincount(fromRungs, weights=subStepTimes)
+    rungCounts = np.bincount(fromRungs)
+    for rung in getTopIndexes(rungTimes, len(rungTimes)).tolist():
+        if rungCounts[rung]:
+            print >>out, "  %-28s %14.4f s %s in %d sub steps" % ("Rung %d:" % rung, rungTimes[rung], share(rungTimes[rung]), rungCounts[rung])
+
+    print >>out, "Slowest %d big steps:" % min(n, numBigSteps)
+    for row in getTopIndexes(logobject.stepTime, n).tolist():
+        slowest = phases[int(np.argmax(stepTimes[phases, row]))] if phases else None
+        print >>out, "  %-28s %14.4f s %s, slowest phase %s %g s" % ("Step %d:" % logobject.stepNumber[row], logobject.stepTime[row], share(logobject.stepTime[row]),
+                                                                     titles.get(slowest), stepTimes[slowest, row] if phases else 0)
+
+    print >>out, "Slowest %d sub steps:" % min(n, len(subStepTimes))
+    top = getTopIndexes(subStepTimes, n)
+    # Time of each phase in the slowest sub steps, from their events only
+    rank = np.full(len(logobject.rungs), -1, np.int64)
+    rank[top] = np.arange(len(top))
+    inTop = (eventRungs >= 0) & (rank[np.maximum(eventRungs, 0)] >= 0)
+    topPhaseTimes = np.bincount(rank[eventRungs[inTop]] * len(ChangaLog.PHASES) + eventPhases[inTop], weights=eventTimes[inTop],
+                                minlength=len(top) * len(ChangaLog.PHASES)).reshape(len(top), len(ChangaLog.PHASES))
+    for index, row in enumerate(top.tolist()):
+        slowest = phases[int(np.argmax(topPhaseTimes[index, phases]))]
+        rung = logobject.rungs[row]
+        print >>out, "  %-28s %14.4f s %s, slowest phase %s %g s, rungs %d to %d, %d active" % (
+            "Step %d sub step %d:" % (rung['step'], row + 1), subStepTimes[row], share(subStepTimes[row]),
+            titles[slowest], topPhaseTimes[index, slowest], rung['fromRung'], rung['toRung'], rung['gravityActive'])
+
+    print >>out, "Slowest %d phase events:" % min(n, len(events))
+    for index in getTopIndexes(eventTimes, n).tolist():
+        event = events[index]
+        line = logobject.getLogLineNumbers(logobject.eventStep[event], logobject.eventLine[event])
+        print >>out, "  %-28s %14.4f s %s, step %d, line %d" % (titles[eventPhases[index]] + ":", eventTimes[index], share(eventTimes[index]),
+                                                              logobject.eventStep[event], line + 1)
@@ -0,0 +1,202 @@
+# oldtimer_plot.py
+# Draws ChangaLog data onto matplotlib Axes. Used by the GUI on its embedded
+# canvas and by oldtimer_cli.py on off-screen figures, so it imports
+# neither pylab nor a GUI backend.
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.ticker import MaxNLocator, ScalarFormatter
+
+# Colors of successive bar plots on the same axes
+BAR_COLORS = ['b', 'g', 'y', 'r', 'm', 'c', 'k']
+BAR_WIDTH = 0.35
+
+# Most points whose tick labels and annotations are written; with more points
+# shown the x axis has plain numbered ticks
+MAX_LABELS = 60
+
+# Draws a line of times onto axes, and returns its LODLine
+# dataY, dataX, ticksX, annotations: as returned by ChangaLog.getData
+# axisY: legend label, axisX: x axis label
+# bool dostep: draw steps instead of points joined by lines
+# bool doannotate: write the annotation next to each point
+def drawPlot(axes, dataY, dataX, ticksX, annotations, axisY, axisX, dostep, doannotate):
+    if dostep:
+        line, = axes.step([], [], where='post', linestyle='-', label=axisY) # where=post steps after point
+    else:
+        line, = axes.plot([], [], marker='o', ms=5.0, linestyle='-', label=axisY)
+
+    plot = LODLine(line, dostep, doannotate)
+    plot.setPoints(dataY, dataX, ticksX, annotations)
+    if plot.extent is not None:
+        axes.update_datalim(plot.extent)
+        axes.autoscale_view()
+    plot.update()
+
+    axes.legend()
+    axes.set_xlabel(axisX)
+    axes.set_ylabel('time (s)')
+    return plot
+
+# Writes each annotation next to its point, and returns the list of texts
+def annotatePlot(axes, annotations, dataX, dataY):
+    return [axes.annotate(note, (x, y), xytext=(2,2), xycoords='data', textcoords='offset points')
+            for note, x, y in zip(annotations, dataX, dataY)]
+
+# Fits the view of axes to the whole data of its LODLines, whose artists only
+# hold the part of the data in view
+def autoscalePlots(axes, plots):
+    axes.ignore_existing_data_limits = True
+    for plot in plots:
+        if plot.extent is not None:
+            axes.update_datalim(plot.extent)
+    axes.autoscale_view()
+
+# Returns the points of dataX and dataY from index start to end reduced to
+# numBuckets buckets of consecutive points, as (x, low, high, mean) with the
+# mean x, smallest y, largest y and mean y in each bucket.
+def getEnvelope(dataX, dataY, start, end, numBuckets):
+    edges = np.arange(numBuckets) * (end - start) // numBuckets
+    counts = np.diff(np.append(edges, end - start))
+    x = np.add.reduceat(dataX[start:end], edges) / counts
+    low = np.minimum.reduceat(dataY[start:end], edges)
+    high = np.maximum.reduceat(dataY[start:end], edges)
+    mean = np.add.reduceat(dataY[start:end], edges) / counts
+    return x, low, high, mean
+
+# Line of a plot drawn at the level of detail of the x range in view, so that
+# pan and zoom stay quick with any number of points. With more points in view
+# than the axes are wide in pixels, the line joins the means of the points in
+# each pixel column and their range is shaded. Tick labels and annotations are
+# written once at most MAX_LABELS points are in view.
+# The line, shading and annotations are redrawn by update, which is called
+# whenever the x range of the axes changes.
+class LODLine():
+    def __init__(self, line, dostep, doannotate):
+        self.line = line
+        self.axes = line.axes
+        self.dostep = dostep
+        self.doannotate = doannotate
+        # Whether the artists are left out of full redraws, see setAnimated
+        self.animated = False
+        # Shading between the smallest and largest times, or None
+        self.envelope = None
+        # Texts of the annotations in view
+        self.notes = []
+        # Tick labels written by the last update, or None
+        self.shownTicks = None
+        self.setPoints([], [], [], [])
+        self.axes.callbacks.connect('xlim_changed', self.update)
+
+    # Replaces the data of the line, e.g. after its log grew or another axis was
+    # selected. The caller rescales the axes (see autoscalePlots) and calls update.
+    # dataY, dataX, ticksX, annotations: as for drawPlot
+    # Tick labels and annotations are only read a slice at a time by update,
+    # so they are kept as given rather than copied.
+    def setPoints(self, dataY, dataX, ticksX, annotations):
+        if not len(ticksX):
+            ticksX = dataX
+        self.dataX = np.asarray(dataX, dtype=np.float64)
+        self.dataY = np.asarray(dataY, dtype=np.float64)
+        self.ticks = ticksX
+        self.annotations = annotations
+        # Corners of the data, for autoscalePlots
+        if len(self.dataX):
+            self.extent = [(self.dataX.min(), self.dataY.min()), (self.dataX.max(), self.dataY.max())]
+        else:
+            self.extent = None
+
+    def setStyle(self, label, dostep, doannotate):
+        self.dostep = dostep
+        self.doannotate = doannotate
+        self.line.set_label(label)
+        if dostep:
+            self.line.set_drawstyle('steps-post')
+            self.line.set_marker('None')
+        else:
+            self.line.set_drawstyle('default')
+            self.line.set_marker('o')
+
+    # Leaves the artists out of full redraws of the canvas, to be blitted over it
+    def setAnimated(self, animated):
+        self.animated = animated
+        for artist in self.getArtists():
+            artist.set_animated(animated)
+
+    def getArtists(self):
+        artists = [self.line] + self.notes
+        if self.envelope is not None:
+            artists.append(self.envelope)
+        return artists
+
+    # Draws the part of the data in the x range of the axes
+    def update(self, *args):
+        axes = self.axes
+        xmin, xmax = axes.get_xlim()
+        first = np.searchsorted(self.dataX, xmin, 'left')
+        last = np.searchsorted(self.dataX, xmax, 'right')
+        # One more point on each side, so that the line runs off the axes
+        start = max(0, first - 1)
+        end = min(len(self.dataX), last + 1)
+
+        if self.envelope is not None:
+            self.envelope.remove()
+            self.envelope = None
+        numBuckets = max(1, int(axes.bbox.width))
+        if end - start > numBuckets:
+            x, low, high, mean = getEnvelope(self.dataX, self.dataY, start, end, numBuckets)
+            self.line.set_data(x, mean)
+            if self.dostep:
+                # Each time holds until the next point
+                x, low, high = np.repeat(x, 2)[1:], np.repeat(low, 2)[:-1], np.repeat(high, 2)[:-1]
+            outline = np.column_stack((np.concatenate((x, x[::-1])), np.concatenate((high, low[::-1]))))
+            self.envelope = PolyCollection([outline], facecolors=self.line.get_color(), alpha=0.3,
+                                           linewidths=0, label='_nolegend_', animated=self.animated)
+            # Without changing the data limits, which cover the whole data
+            axes.add_collection(self.envelope, autolim=False)
+        else:
+            self.line.set_data(self.dataX[start:end], self.dataY[start:end])
+
+        for note in self.notes:
+            note.remove()
+        self.notes = []
+        if last - first <= MAX_LABELS:
+            self.shownTicks = list(self.ticks[first:last])
+            axes.set_xticks(self.dataX[first:last])
+            axes.set_xticklabels(self.shownTicks, horizontalalignment='left', rotation=30)
+            if self.doannotate:
+                self.notes = annotatePlot(axes, self.annotations[first:last], self.dataX[first:last], self.dataY[first:last])
+                for note in self.notes:
+                    note.set_animated(self.animated)
+        else:
+            self.shownTicks = None
+            axes.xaxis.set_major_locator(MaxNLocator(integer=True))
+            axes.xaxis.set_major_formatter(ScalarFormatter())
+
+# Draws bars of times onto axes, next to the numBars bar plots already there,
+# and returns the bars
+# dataY, dataX: as returned by ChangaLog.getSummedRungs
+def drawBarPlot(axes, numBars, dataY, dataX, axisY, axisX):
+    x = np.arange(len(dataY))
+    thisColor = BAR_COLORS[numBars%len(BAR_COLORS)]
+    bars = axes.bar(x+(BAR_WIDTH-0.1)*numBars, dataY, BAR_WIDTH, color=thisColor, label=axisY)
+    axes.set_xticks(x)
+    axes.set_xticklabels(dataX, rotation=30, size='small')
+    axes.set_xlabel(axisX)
+    axes.set_ylabel('time (s)')
+    axes.legend()
+    return bars
+
+# Replaces the heights of bars drawn by drawBarPlot, if there are as many bars.
+# The caller redraws the canvas.
+# Returns whether the bars could be updated.
+def updateBarPlot(bars, dataY):
+    if len(bars.patches) != len(dataY):
+        return False
+    for bar, height in zip(bars.patches, dataY):
+        bar.set_height(height)
+    axes = bars.patches[0].axes if bars.patches else None
+    if axes is not None:
+        axes.relim()
+        axes.autoscale_view()
+    return True
@@ -145,9 +145,18 @@ class Ui_MainWindow(object):
         MainWindow.setStatusBar(self.statusbar)
         self.action_Open = QtGui.QAction(MainWindow)
         self.action_Open.setObjectName("action_Open")
+        self.action_Follow = QtGui.QAction(MainWindow)
+        self.action_Follow.setObjectName("action_Follow")
+        self.action_Stats = QtGui.QAction(MainWindow)
+        self.action_Stats.setObjectName("action_Stats")
+        self.action_Compare = QtGui.QAction(MainWindow)
+        self.action_Compare.setObjectName("action_Compare")
         self.actionE_xit = QtGui.QAction(MainWindow)
         self.actionE_xit.setObjectName("actionE_xit")
         self.menu_File.addAction(self.action_Open)
+        self.menu_File.addAction(self.action_Follow)
+        self.menu_File.addAction(self.action_Stats)
+        self.menu_File.addAction(self.action_Compare)
         self.menu_File.addAction(self.actionE_xit)
         self.menubar.addAction(self.menu_File.menuAction())
 
@@ -168,5 +177,8 @@ class Ui_MainWindow(object):
         self.checkBoxAnnotate.setText(QtGui.QApplication.translate("MainWindow", "Annotate", None, QtGui.QApplication.UnicodeUTF8))
         self.menu_File.setTitle(QtGui.QApplication.translate("MainWindow", "&File", None, QtGui.QApplication.UnicodeUTF8))
         self.action_Open.setText(QtGui.QApplication.translate("MainWindow", "&Open", None, QtGui.QApplication.UnicodeUTF8))
+        self.action_Follow.setText(QtGui.QApplication.translate("MainWindow", "&Follow", None, QtGui.QApplication.UnicodeUTF8))
+        self.action_Stats.setText(QtGui.QApplication.translate("MainWindow", "Print &Stats", None, QtGui.QApplication.UnicodeUTF8))
+        self.action_Compare.setText(QtGui.QApplication.translate("MainWindow", "&Compare Logs", None, QtGui.QApplication.UnicodeUTF8))
         self.actionE_xit.setText(QtGui.QApplication.translate("MainWindow", "E&xit", None, QtGui.QApplication.UnicodeUTF8))
 